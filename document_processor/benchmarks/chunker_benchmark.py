@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пропускной способности чанкера относительно прежнего process_text
+на регулярных выражениях.
+
+Запуск из каталога document_processor:
+    python benchmarks/chunker_benchmark.py --megabytes 8 --max-length 1000
+    python benchmarks/chunker_benchmark.py --file document.txt
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunker import iter_chunks  # noqa: E402
+
+WORDS = (
+    "документ договор поставка сторона оплата срок обязательство товар акт "
+    "приложение ответственность порядок расчет цена условие изменение"
+).split()
+
+
+def legacy_process_text(text: str, max_length: int):
+    """
+    Прежняя реализация utils.process_text: строка на каждый токен и разделитель
+    """
+    parts = []
+    current_part = []
+    current_length = 0
+
+    for word in re.split(r"(\s+|\W)", text):
+        if current_length + len(word) > max_length:
+            parts.append("".join(current_part))
+            current_part = []
+            current_length = 0
+        current_part.append(word)
+        current_length += len(word)
+    if current_part:
+        parts.append("".join(current_part))
+    return parts
+
+
+def make_text(megabytes: float, seed: int) -> str:
+    """
+    Синтетический текст из предложений и абзацев заданного размера в символах
+    """
+    rng = np.random.default_rng(seed)
+    target = int(megabytes * 1024 * 1024)
+    paragraphs = []
+    size = 0
+    while size < target:
+        sentences = []
+        for _ in range(rng.integers(2, 8)):
+            words = rng.choice(WORDS, size=rng.integers(5, 20))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(name: str, func, text: str, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunks = func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    megabytes = len(text) / (1024 * 1024)
+    print(
+        f"{name:<28} {best * 1000:>9.1f} {megabytes / best:>9.1f} "
+        f"{peak / (1024 * 1024):>9.1f} {len(chunks):>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--file", help="Текстовый файл вместо синтетического текста")
+    parser.add_argument("--max-length", type=int, default=1000)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = make_text(args.megabytes, args.seed)
+    print(f"Text: {len(text) / (1024 * 1024):.1f}M chars, max_length={args.max_length}")
+    print(f"{'method':<28} {'ms':>9} {'MB/s':>9} {'peak MB':>9} {'chunks':>8}")
+
+    measure(
+        "legacy regex",
+        lambda: legacy_process_text(text, args.max_length),
+        text,
+        args.repeats,
+    )
+    for boundary in ("word", "sentence", "paragraph"):
+        measure(
+            f"offsets, {boundary}",
+            lambda: list(iter_chunks(text, args.max_length, boundary=boundary)),
+            text,
+            args.repeats,
+        )
+    measure(
+        f"offsets, {args.max_tokens} tok/{args.overlap} ov",
+        lambda: list(
+            iter_chunks(
+                text,
+                args.max_length,
+                max_tokens=args.max_tokens,
+                overlap_tokens=args.overlap,
+            )
+        ),
+        text,
+        args.repeats,
+    )
+
+
+if __name__ == "__main__":
+    main()
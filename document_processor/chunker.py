@@ -0,0 +1,133 @@
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+PARAGRAPH = "paragraph"
+SENTENCE = "sentence"
+WORD = "word"
+
+# Граница более высокого уровня выбирается, только если чанк заполнен хотя бы
+# на эту долю бюджета, иначе берется граница уровнем ниже
+MIN_FILL = 0.5
+
+# Таблицы признаков по коду символа; коды за пределами таблицы попадают
+# в последний элемент (False) через np.take(mode="clip")
+_TABLE_SIZE = 0x3002
+_IS_SPACE = np.array([chr(c).isspace() for c in range(_TABLE_SIZE - 1)] + [False])
+_IS_SENTENCE_END = np.zeros(_TABLE_SIZE, dtype=bool)
+_IS_SENTENCE_END[[ord(c) for c in ".!?…"]] = True
+_IS_CLOSING = np.zeros(_TABLE_SIZE, dtype=bool)
+_IS_CLOSING[[ord(c) for c in "\"')]»”’"]] = True
+
+
+class Boundaries(NamedTuple):
+    # Смещения первого и последнего символа каждого токена (слова без пробелов)
+    token_starts: np.ndarray
+    token_ends: np.ndarray
+    # Номера токенов, с которых начинается новое предложение или абзац
+    sentence_starts: np.ndarray
+    paragraph_starts: np.ndarray
+
+
+def find_boundaries(text: str) -> Boundaries:
+    """
+    Находит границы токенов, предложений и абзацев векторно по кодам символов,
+    не создавая строк на каждый токен
+    """
+    # surrogatepass: одиночные суррогаты (битый текст из OCR и PDF) кодируются
+    # своим кодом, а не прерывают разбиение
+    codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+    is_space = np.take(_IS_SPACE, codes, mode="clip")
+    word = ~is_space
+    token_starts = np.flatnonzero(word[1:] & is_space[:-1]) + 1
+    token_ends = np.flatnonzero(word[:-1] & is_space[1:])
+    if len(codes) and word[0]:
+        token_starts = np.concatenate(([0], token_starts))
+    if len(codes) and word[-1]:
+        token_ends = np.concatenate((token_ends, [len(codes) - 1]))
+    del word, is_space
+
+    # Предложение заканчивается знаком конца, возможно за ним кавычка или скобка
+    last = codes[token_ends[:-1]]
+    before_last = codes[np.maximum(token_ends[:-1] - 1, 0)]
+    sentence_end = np.take(_IS_SENTENCE_END, last, mode="clip") | (
+        np.take(_IS_CLOSING, last, mode="clip")
+        & np.take(_IS_SENTENCE_END, before_last, mode="clip")
+    )
+    sentence_starts = np.flatnonzero(sentence_end) + 1
+
+    # Абзац - хотя бы два перевода строки в пробелах между токенами
+    newlines = np.flatnonzero(codes == ord("\n"))
+    gap_newlines = np.searchsorted(newlines, token_starts[1:]) - np.searchsorted(
+        newlines, token_ends[:-1]
+    )
+    paragraph_starts = np.flatnonzero(gap_newlines >= 2) + 1
+
+    return Boundaries(token_starts, token_ends, sentence_starts, paragraph_starts)
+
+
+def _last_boundary(starts: np.ndarray, low: float, high: int) -> Optional[int]:
+    """
+    Последняя граница из starts в диапазоне (low, high]
+    """
+    index = np.searchsorted(starts, high, side="right") - 1
+    if index >= 0 and starts[index] > low:
+        return int(starts[index])
+    return None
+
+
+def iter_chunks(
+    text: str,
+    max_chars: Optional[int] = 3000,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    boundary: str = PARAGRAPH,
+) -> Iterator[str]:
+    """
+    Лениво режет текст на чанки по смещениям в исходной строке.
+
+    Чанк не длиннее max_chars символов и max_tokens токенов (слов, разделенных
+    пробельными символами). Конец чанка по возможности ставится на границу
+    абзаца, затем предложения (в зависимости от boundary), иначе между словами.
+    Соседние чанки перекрываются на overlap_tokens токенов. Слово длиннее
+    max_chars режется по символам.
+    """
+    bounds = find_boundaries(text)
+    starts, ends = bounds.token_starts, bounds.token_ends
+    tokens_count = len(starts)
+    levels = []
+    if boundary == PARAGRAPH:
+        levels.append(bounds.paragraph_starts)
+    if boundary in (PARAGRAPH, SENTENCE):
+        levels.append(bounds.sentence_starts)
+
+    first = 0
+    while first < tokens_count:
+        last = tokens_count
+        if max_tokens:
+            last = min(last, first + max_tokens)
+        if max_chars:
+            char_limit = int(starts[first]) + max_chars - 1
+            last = min(last, int(np.searchsorted(ends, char_limit, side="right")))
+
+        if last <= first:
+            # Одно слово не помещается в max_chars
+            token_end = int(ends[first]) + 1
+            for offset in range(int(starts[first]), token_end, max_chars):
+                yield text[offset : min(offset + max_chars, token_end)]
+            first += 1
+            continue
+
+        end = last
+        if last < tokens_count:
+            low = first + MIN_FILL * (last - first)
+            for level in levels:
+                found = _last_boundary(level, low, last)
+                if found is not None:
+                    end = found
+                    break
+
+        yield text[starts[first] : ends[end - 1] + 1]
+        if end >= tokens_count:
+            break
+        first = max(end - overlap_tokens, first + 1)
@@ -1,5 +1,5 @@
 from pydantic import Field, AnyUrl
-from typing import Optional
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +12,68 @@ class AppConfig(BaseSettings):
         default="sergeyzh/rubert-mini-frida", env="EMBEDDER_MODEL"
     )
     OCR_MODEL: Optional[str] = Field(default="gpt-4o-mini", env="OCR_MODEL")
+    OCR_CONCURRENCY: int = Field(default=8, env="OCR_CONCURRENCY")
+    OCR_MAX_RETRIES: int = Field(default=3, env="OCR_MAX_RETRIES")
+    OCR_RETRY_BACKOFF: float = Field(default=1.0, env="OCR_RETRY_BACKOFF")
+    OCR_TIMEOUT: float = Field(default=120.0, env="OCR_TIMEOUT")
+    OCR_CACHE_ENABLED: bool = Field(default=True, env="OCR_CACHE_ENABLED")
+    OCR_CACHE_DIR: str = Field(default="data/ocr_cache", env="OCR_CACHE_DIR")
+    OCR_CACHE_MAX_BYTES: int = Field(
+        default=256 * 1024 * 1024, env="OCR_CACHE_MAX_BYTES"
+    )
+    RESULT_STORE_ENABLED: bool = Field(default=True, env="RESULT_STORE_ENABLED")
+    RESULT_STORE_DIR: str = Field(default="data/results", env="RESULT_STORE_DIR")
+    RESULT_STORE_MAX_ENTRIES: int = Field(
+        default=1000, env="RESULT_STORE_MAX_ENTRIES"
+    )
+    EMBEDDING_BATCH_SIZE: int = Field(default=64, env="EMBEDDING_BATCH_SIZE")
+    EMBEDDING_THREADS: int = Field(default=1, env="EMBEDDING_THREADS")
+    EMBEDDING_PROCESSES: int = Field(default=0, env="EMBEDDING_PROCESSES")
+    EMBEDDING_MULTIPROCESS_MIN_TEXTS: int = Field(
+        default=5000, env="EMBEDDING_MULTIPROCESS_MIN_TEXTS"
+    )
+    EMBEDDING_CACHE_ENABLED: bool = Field(default=True, env="EMBEDDING_CACHE_ENABLED")
+    EMBEDDING_CACHE_DIR: str = Field(
+        default="data/embedding_cache", env="EMBEDDING_CACHE_DIR"
+    )
+    EMBEDDING_CACHE_MAX_ENTRIES: int = Field(
+        default=1_000_000, env="EMBEDDING_CACHE_MAX_ENTRIES"
+    )
+    CHUNK_BOUNDARY: Literal["paragraph", "sentence", "word"] = Field(
+        default="paragraph", env="CHUNK_BOUNDARY"
+    )
+    CHUNK_MAX_TOKENS: int = Field(default=0, env="CHUNK_MAX_TOKENS")
+    CHUNK_OVERLAP_TOKENS: int = Field(default=0, env="CHUNK_OVERLAP_TOKENS")
+    XLSX_CHUNK_MAX_LENGTH: int = Field(default=2000, env="XLSX_CHUNK_MAX_LENGTH")
+    XLSX_READ_BLOCK_ROWS: int = Field(default=5000, env="XLSX_READ_BLOCK_ROWS")
+    LLM_SPLIT_CONCURRENCY: int = Field(default=8, env="LLM_SPLIT_CONCURRENCY")
+    LLM_SPLIT_MAX_RETRIES: int = Field(default=2, env="LLM_SPLIT_MAX_RETRIES")
+    LLM_SPLIT_RETRY_BACKOFF: float = Field(default=1.0, env="LLM_SPLIT_RETRY_BACKOFF")
+    UPLOAD_MAX_BYTES: int = Field(default=268_435_456, env="UPLOAD_MAX_BYTES")
+    UPLOAD_TMP_DIR: str = Field(default="data/uploads", env="UPLOAD_TMP_DIR")
+    BATCH_CONCURRENCY: int = Field(default=8, env="BATCH_CONCURRENCY")
+    BATCH_MAX_DOCUMENTS: int = Field(default=1000, env="BATCH_MAX_DOCUMENTS")
+    BATCH_MAX_BYTES: int = Field(default=1_073_741_824, env="BATCH_MAX_BYTES")
+    JOB_WORKERS: int = Field(default=2, env="JOB_WORKERS")
+    JOB_STORE_DIR: str = Field(default="data/jobs", env="JOB_STORE_DIR")
+    JOB_RESULT_TTL_SECONDS: float = Field(
+        default=86400.0, env="JOB_RESULT_TTL_SECONDS"
+    )
+    EXTRACTION_PROCESSES: int = Field(default=2, env="EXTRACTION_PROCESSES")
+    EXTRACTION_TIMEOUT: float = Field(default=300.0, env="EXTRACTION_TIMEOUT")
+    EXTRACTION_MEMORY_LIMIT_MB: int = Field(
+        default=2048, env="EXTRACTION_MEMORY_LIMIT_MB"
+    )
+    PDF_RENDER_BATCH_PAGES: int = Field(default=4, env="PDF_RENDER_BATCH_PAGES")
+    PDF_TEXT_MIN_CHARS: int = Field(default=50, env="PDF_TEXT_MIN_CHARS")
+    PDF_TEXT_MAX_GARBAGE_RATIO: float = Field(
+        default=0.05, env="PDF_TEXT_MAX_GARBAGE_RATIO"
+    )
+    LLM_POOL_MAX_SIZE: int = Field(default=32, env="LLM_POOL_MAX_SIZE")
+    LLM_MAX_CONNECTIONS: int = Field(default=100, env="LLM_MAX_CONNECTIONS")
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        default=20, env="LLM_MAX_KEEPALIVE_CONNECTIONS"
+    )
 
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", case_sensitive=False, extra="allow"
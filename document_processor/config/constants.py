@@ -45,6 +45,8 @@ TABLE_PROCESSING_PROMPT = """
 Не добавляй дополнительных комментариев, начни отвечать с [
 """
 
+OCR_PROMPT = "Ты OCR модель. Извлеки весь текст из этого изображения. Верни только текст без дополнительных комментариев."
+
 EMBEDDING_ERROR_MESSAGE = "Ошибка при получении эмбеддингов для документа"
 PROCESSING_ERROR_MESSAGE = "Ошибка при обработке документа"
 INVALID_FILE_TYPE_MESSAGE = "Неподдерживаемый тип файла"
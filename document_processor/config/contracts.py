@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 from enum import Enum
 from config.app_settings import AppConfig
 from config.constants import DOCUMENT_SPLIT_PROMPT, TABLE_PROCESSING_PROMPT
@@ -13,6 +14,13 @@ class SplitMethod(str, Enum):
     BATCH = "batch"
 
 
+class EmbeddingFormat(str, Enum):
+    JSON = "json"
+    BASE64_FLOAT32 = "base64_float32"
+    BASE64_FLOAT16 = "base64_float16"
+    BINARY = "binary"
+
+
 class Status(str, Enum):
     SUCCESS = "success"
     ERROR = "error"
@@ -42,6 +50,21 @@ class DocumentRequest(BaseModel):
     prompt_table: Optional[str] = Field(
         default=TABLE_PROCESSING_PROMPT, description="Промпт для обработки таблиц"
     )
+    embedding_format: Optional[EmbeddingFormat] = Field(
+        default=EmbeddingFormat.JSON,
+        description="Формат эмбеддингов в ответе: json, base64_float32, "
+        "base64_float16 или binary (отдельная часть application/octet-stream)",
+    )
+
+
+class EncodedEmbeddings(BaseModel):
+    data: Optional[str] = Field(
+        default=None,
+        description="Матрица эмбеддингов в base64, little-endian, построчно. "
+        "Для формата binary отсутствует, байты идут отдельной частью ответа",
+    )
+    dtype: str = Field(..., description="Тип элементов: float32 или float16")
+    shape: List[int] = Field(..., description="Размерность [число чанков, dim]")
 
 
 class DocumentResponse(BaseModel):
@@ -54,9 +77,89 @@ class DocumentResponse(BaseModel):
     embeddings: Optional[List[List[float]]] = Field(
         default=None, description="Список эмбеддингов, соответствующих текстовым блокам"
     )
+    embeddings_encoded: Optional[EncodedEmbeddings] = Field(
+        default=None,
+        description="Эмбеддинги в компактном бинарном виде (для форматов, кроме json)",
+    )
     chunks_count: Optional[int] = Field(
         default=None, description="Количество созданных чанков"
     )
     processing_time: Optional[float] = Field(
         default=None, description="Время обработки в секундах"
     )
+    ocr_cache_hits: Optional[int] = Field(
+        default=None, description="Количество страниц, взятых из кэша OCR"
+    )
+    ocr_cache_misses: Optional[int] = Field(
+        default=None, description="Количество страниц, отправленных в OCR"
+    )
+    cached: Optional[bool] = Field(
+        default=None,
+        description="Результат взят из хранилища без повторной обработки",
+    )
+    reused_chunks: Optional[int] = Field(
+        default=None,
+        description="Количество чанков, эмбеддинги которых взяты из предыдущей версии",
+    )
+
+    # Сырые байты float32 для формата binary, в JSON не сериализуются
+    _embeddings_binary: Optional[bytes] = PrivateAttr(default=None)
+
+
+class BatchDocumentResponse(DocumentResponse):
+    filename: Optional[str] = Field(
+        default=None, description="Имя загруженного файла или путь внутри архива"
+    )
+
+
+class BatchResponse(BaseModel):
+    status: Status = Field(..., description="Статус выполнения запроса")
+    message: str = Field(..., description="Сообщение о результате обработки")
+    documents_count: int = Field(..., description="Количество документов в пакете")
+    failed_count: int = Field(..., description="Количество документов с ошибкой")
+    processing_time: float = Field(..., description="Время обработки пакета, сек")
+    documents: List[BatchDocumentResponse] = Field(
+        default_factory=list, description="Результаты по документам в порядке загрузки"
+    )
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobProgress(BaseModel):
+    stage: Optional[str] = Field(
+        default=None,
+        description="Текущий этап: extracting, splitting, embedding или done",
+    )
+    pages_total: Optional[int] = Field(
+        default=None, description="Количество страниц документа (PDF и изображения)"
+    )
+    pages_done: int = Field(default=0, description="Обработано страниц")
+    chunks_total: Optional[int] = Field(
+        default=None, description="Количество чанков для эмбеддинга"
+    )
+    chunks_embedded: int = Field(default=0, description="Получено эмбеддингов")
+
+
+class JobResponse(BaseModel):
+    job_id: UUID = Field(..., description="Идентификатор задания")
+    document_id: UUID = Field(..., description="Уникальный идентификатор документа")
+    status: JobStatus = Field(..., description="Статус задания")
+    progress: JobProgress = Field(
+        default_factory=JobProgress, description="Прогресс обработки"
+    )
+    message: Optional[str] = Field(
+        default=None, description="Сообщение об ошибке или отмене"
+    )
+    created_at: datetime = Field(..., description="Время постановки в очередь")
+    started_at: Optional[datetime] = Field(
+        default=None, description="Время начала обработки"
+    )
+    finished_at: Optional[datetime] = Field(
+        default=None, description="Время завершения обработки"
+    )
@@ -1,12 +1,20 @@
+import asyncio
 import logging
 import json
 import time
 import uuid
-from typing import List, Optional, Self
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
+import base64
+from typing import List, NamedTuple, Optional, Tuple, Union
+import numpy as np
 from langchain.chains import LLMChain
-from config.contracts import DocumentResponse, Status, SplitMethod
+from config.contracts import (
+    DocumentRequest,
+    DocumentResponse,
+    EmbeddingFormat,
+    EncodedEmbeddings,
+    Status,
+    SplitMethod,
+)
 from config.app_settings import AppConfig
 from sentence_transformers import SentenceTransformer
 from config.constants import (
@@ -15,84 +23,284 @@ from config.constants import (
     INVALID_FILE_TYPE_MESSAGE,
 )
 from utils import process_file, process_text
+from llm_pool import LLMPool
+from ocr_cache import OcrCacheCounter, ocr_cache_counter
+from result_store import ResultStore, chunk_hash
+from embedding_cache import EmbeddingCache
+from embedding_encoder import EmbeddingEncoder
+from progress import advance_progress, set_progress
 
 logger = logging.getLogger(__name__)
 app_config = AppConfig()
 
 
+def pack_embeddings(
+    response: DocumentResponse,
+    embeddings: np.ndarray,
+    embedding_format: EmbeddingFormat,
+) -> DocumentResponse:
+    """
+    Кладет матрицу эмбеддингов в ответ в запрошенном формате
+    """
+    if embedding_format == EmbeddingFormat.JSON:
+        response.embeddings = embeddings.tolist()
+        return response
+
+    if embedding_format == EmbeddingFormat.BASE64_FLOAT16:
+        dtype = "float16"
+    else:
+        dtype = "float32"
+    payload = np.ascontiguousarray(
+        embeddings, dtype=np.dtype(dtype).newbyteorder("<")
+    ).tobytes()
+    response.embeddings_encoded = EncodedEmbeddings(
+        dtype=dtype, shape=list(embeddings.shape)
+    )
+    if embedding_format == EmbeddingFormat.BINARY:
+        response._embeddings_binary = payload
+    else:
+        response.embeddings_encoded.data = base64.b64encode(payload).decode("ascii")
+    return response
+
+
+class ExtractedDocument(NamedTuple):
+    # Документ после извлечения и разделения, ожидающий эмбеддингов
+    document_id: str
+    texts: List[str]
+    fingerprint: Optional[str]
+    embedding_format: EmbeddingFormat
+    start_time: float
+    ocr_counter: OcrCacheCounter
+
+
 class DocumentPipeline:
     def __init__(self, config: AppConfig = app_config):
         self.config = config
         self.embedder = SentenceTransformer(self.config.EMBEDDER_MODEL)
+        self.encoder = EmbeddingEncoder(
+            self.embedder,
+            batch_size=self.config.EMBEDDING_BATCH_SIZE,
+            threads=self.config.EMBEDDING_THREADS,
+            processes=self.config.EMBEDDING_PROCESSES,
+            multiprocess_min_texts=self.config.EMBEDDING_MULTIPROCESS_MIN_TEXTS,
+        )
+        self.llm_pool = LLMPool(
+            api_key=self.config.OPENAI_API_KEY,
+            base_url=str(self.config.OPENAI_BASE_URL),
+            max_size=self.config.LLM_POOL_MAX_SIZE,
+            max_connections=self.config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=self.config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
+        self.result_store = (
+            ResultStore(
+                self.config.RESULT_STORE_DIR, self.config.RESULT_STORE_MAX_ENTRIES
+            )
+            if self.config.RESULT_STORE_ENABLED
+            else None
+        )
+        self.embedding_cache = (
+            EmbeddingCache(
+                self.config.EMBEDDING_CACHE_DIR,
+                self.config.EMBEDDER_MODEL,
+                self.config.EMBEDDING_CACHE_MAX_ENTRIES,
+            )
+            if self.config.EMBEDDING_CACHE_ENABLED
+            else None
+        )
         logger.info("Initialized Document Pipeline class")
 
-    async def _init_llm(
+    @staticmethod
+    def _request_params(request: DocumentRequest) -> dict:
+        return {
+            "document_id": str(request.document_id),
+            "split_method": SplitMethod(request.split_method),
+            "batch_size": request.batch_size,
+            "llm_model": request.llm_model,
+            "temperature": request.temperature,
+            "prompt_split": request.prompt_split,
+            "prompt_table": request.prompt_table,
+            "embedding_format": EmbeddingFormat(request.embedding_format),
+        }
+
+    async def process_request(
+        self, file_path: str, request: DocumentRequest
+    ) -> DocumentResponse:
+        """
+        Обрабатывает файл file_path с параметрами из DocumentRequest
+        """
+        return await self.process_document(
+            file_path=file_path, **self._request_params(request)
+        )
+
+    async def process_batch(
+        self, documents: List[Tuple[str, DocumentRequest]]
+    ) -> List[DocumentResponse]:
+        """
+        Обрабатывает несколько документов. Извлечение и разделение идут
+        параллельно, не более BATCH_CONCURRENCY документов одновременно, затем
+        чанки всех документов кодируются общими батчами.
+        Ответы возвращаются в порядке documents
+        """
+        semaphore = asyncio.Semaphore(self.config.BATCH_CONCURRENCY)
+
+        async def extract(file_path: str, request: DocumentRequest):
+            async with semaphore:
+                return await self._extract_document(
+                    file_path, **self._request_params(request)
+                )
+
+        extracted = await asyncio.gather(
+            *[extract(file_path, request) for file_path, request in documents]
+        )
+        pending = [item for item in extracted if isinstance(item, ExtractedDocument)]
+        logger.info(
+            f"Extracted {len(pending)} of {len(documents)} documents, embedding "
+            f"{sum(len(item.texts) for item in pending)} chunks in shared batches"
+        )
+        embedded = iter(await self._embed_documents(pending) if pending else [])
+        return [
+            next(embedded) if isinstance(item, ExtractedDocument) else item
+            for item in extracted
+        ]
+
+    async def process_document(
         self,
+        file_path: str,
+        document_id: uuid.UUID,
+        split_method: SplitMethod,
+        batch_size: int,
         llm_model: str,
         temperature: float,
         prompt_split: str,
         prompt_table: str,
-    ) -> Self:
-        logger.info("Initializing LangChain model and prompts")
-        self.llm = ChatOpenAI(
-            openai_api_key=self.config.OPENAI_API_KEY,
-            model_name=llm_model,
-            temperature=temperature,
-            base_url=str(self.config.OPENAI_BASE_URL),
+        embedding_format: EmbeddingFormat = EmbeddingFormat.JSON,
+    ) -> DocumentResponse:
+        extracted = await self._extract_document(
+            file_path,
+            document_id,
+            split_method,
+            batch_size,
+            llm_model,
+            temperature,
+            prompt_split,
+            prompt_table,
+            embedding_format,
         )
+        if isinstance(extracted, DocumentResponse):
+            return extracted
+        return (await self._embed_documents([extracted]))[0]
 
-        self.split_prompt = PromptTemplate(
-            input_variables=["text"],
-            template=prompt_split,
-        )
-        self.table_prompt = PromptTemplate(
-            input_variables=["table_data"],
-            template=prompt_table,
+    @staticmethod
+    def _error_response(
+        document_id: str,
+        message: str,
+        start_time: float,
+        ocr_counter: OcrCacheCounter,
+    ) -> DocumentResponse:
+        return DocumentResponse(
+            status=Status.ERROR,
+            message=message,
+            document_id=document_id,
+            texts=[],
+            embeddings=[],
+            chunks_count=0,
+            processing_time=time.time() - start_time,
+            ocr_cache_hits=ocr_counter.hits,
+            ocr_cache_misses=ocr_counter.misses,
         )
 
-        self.split_chain = LLMChain(llm=self.llm, prompt=self.split_prompt)
-        self.table_chain = LLMChain(llm=self.llm, prompt=self.table_prompt)
-        return self
-
-    async def process_document(
+    async def _extract_document(
         self,
-        file_binary: bytes,
-        document_id: uuid.UUID,
+        file_path: str,
+        document_id: str,
         split_method: SplitMethod,
         batch_size: int,
         llm_model: str,
         temperature: float,
         prompt_split: str,
         prompt_table: str,
-    ) -> DocumentResponse:
+        embedding_format: EmbeddingFormat,
+    ) -> Union[ExtractedDocument, DocumentResponse]:
+        """
+        Извлекает текст документа и делит его на чанки. Возвращает готовый
+        DocumentResponse, если результат взят из хранилища или произошла ошибка
+        """
         start_time = time.time()
+        # Счетчик кэша OCR виден всем задачам, созданным при обработке документа
+        ocr_counter = OcrCacheCounter()
+        counter_token = ocr_cache_counter.set(ocr_counter)
 
         try:
             logger.info(f"Processing document {document_id} with method {split_method}")
 
-            if split_method == SplitMethod.LLM:
-                await self._init_llm(llm_model, temperature, prompt_split, prompt_table)
+            # Идентичный файл с теми же параметрами уже обрабатывался
+            fingerprint = None
+            if self.result_store is not None:
+                params = {
+                    "split_method": SplitMethod(split_method).value,
+                    "batch_size": batch_size,
+                    "llm_model": llm_model,
+                    "temperature": temperature,
+                    "prompt_split": prompt_split,
+                    "prompt_table": prompt_table,
+                    "embedder_model": self.config.EMBEDDER_MODEL,
+                    "chunk_boundary": self.config.CHUNK_BOUNDARY,
+                    "chunk_max_tokens": self.config.CHUNK_MAX_TOKENS,
+                    "chunk_overlap_tokens": self.config.CHUNK_OVERLAP_TOKENS,
+                    "xlsx_chunk_max_length": self.config.XLSX_CHUNK_MAX_LENGTH,
+                }
+                fingerprint = await asyncio.to_thread(
+                    ResultStore.fingerprint, file_path, params
+                )
+                stored = await asyncio.to_thread(self.result_store.get, fingerprint)
+                if stored is not None:
+                    await asyncio.to_thread(
+                        self.result_store.link, document_id, fingerprint
+                    )
+                    processing_time = time.time() - start_time
+                    set_progress(
+                        stage="done",
+                        chunks_total=len(stored.texts),
+                        chunks_embedded=len(stored.texts),
+                    )
+                    logger.info(
+                        f"Returning stored result {fingerprint} "
+                        f"for document {document_id}"
+                    )
+                    response = DocumentResponse(
+                        status=Status.SUCCESS,
+                        message="Document processed successfully",
+                        document_id=document_id,
+                        texts=stored.texts,
+                        chunks_count=len(stored.texts),
+                        processing_time=processing_time,
+                        ocr_cache_hits=ocr_counter.hits,
+                        ocr_cache_misses=ocr_counter.misses,
+                        cached=True,
+                        reused_chunks=len(stored.texts),
+                    )
+                    return pack_embeddings(
+                        response, stored.embeddings, embedding_format
+                    )
 
             # Определяем тип файла и извлекаем содержимое
-            file_type, data = await process_file(file_binary)
+            set_progress(stage="extracting")
+            file_type, data = await process_file(file_path)
             logger.info(f"File type detected: {file_type}")
 
             if data == ["unknown"]:
-                processing_time = time.time() - start_time
-                return DocumentResponse(
-                    status=Status.ERROR,
-                    message=INVALID_FILE_TYPE_MESSAGE,
-                    document_id=document_id,
-                    texts=[],
-                    embeddings=[],
-                    chunks_count=0,
-                    processing_time=processing_time,
+                return self._error_response(
+                    document_id, INVALID_FILE_TYPE_MESSAGE, start_time, ocr_counter
                 )
 
+            set_progress(stage="splitting")
             if file_type != "xlsx":
                 if split_method == SplitMethod.LLM:
                     logger.info("Splitting document with LLM")
-                    texts = await self._split_by_llm(data, batch_size)
+                    split_chain = self.llm_pool.get_chain(
+                        llm_model, temperature, prompt_split, ["text"]
+                    )
+                    texts = await self._split_by_llm(split_chain, data, batch_size)
                 else:
                     logger.info(
                         f"Splitting document with batch method, size: {batch_size}"
@@ -101,111 +309,299 @@ class DocumentPipeline:
             else:
                 texts = data
 
-            # Получаем эмбеддинги для всех фрагментов
-            logger.info(f"Getting embeddings for {len(texts)} text chunks")
-            embeddings = await self._get_embeddings(texts)
-
-            processing_time = time.time() - start_time
-            if embeddings is None:
-                return DocumentResponse(
-                    status=Status.ERROR,
-                    message=EMBEDDING_ERROR_MESSAGE,
-                    document_id=document_id,
-                    texts=[],
-                    embeddings=[],
-                    chunks_count=0,
-                    processing_time=processing_time,
-                )
-
-            logger.info(
-                f"Document processing completed successfully. Chunks: {len(texts)}, Time: {processing_time:.2f}s"
-            )
-
-            return DocumentResponse(
-                status=Status.SUCCESS,
-                message="Document processed successfully",
+            return ExtractedDocument(
                 document_id=document_id,
                 texts=texts,
-                embeddings=embeddings,
-                chunks_count=len(texts),
-                processing_time=processing_time,
+                fingerprint=fingerprint,
+                embedding_format=embedding_format,
+                start_time=start_time,
+                ocr_counter=ocr_counter,
             )
 
         except Exception as e:
-            processing_time = time.time() - start_time
             logger.exception(f"Error processing document {document_id}: {str(e)}")
-            return DocumentResponse(
-                status=Status.ERROR,
-                message=f"{PROCESSING_ERROR_MESSAGE}: {str(e)}",
-                document_id=document_id,
-                processing_time=processing_time,
+            return self._error_response(
+                document_id,
+                f"{PROCESSING_ERROR_MESSAGE}: {str(e)}",
+                start_time,
+                ocr_counter,
             )
+        finally:
+            ocr_cache_counter.reset(counter_token)
 
-    async def _process_table_with_llm(self, data: List[str]) -> List[str]:
+    async def _embed_documents(
+        self, documents: List[ExtractedDocument]
+    ) -> List[DocumentResponse]:
         """
-        Обрабатывает таблицу с помощью LLM
+        Получает эмбеддинги чанков документов общими батчами, сохраняет
+        результаты и собирает ответы в порядке documents
         """
+        chunks_total = sum(len(document.texts) for document in documents)
+        logger.info(f"Getting embeddings for {chunks_total} text chunks")
+        set_progress(stage="embedding", chunks_total=chunks_total)
         try:
-            table_data = "\n".join(data)
-
-            response = await self.table_chain.apredict(table_data=table_data)
+            results = await self._get_embeddings_incremental(
+                [(document.document_id, document.texts) for document in documents]
+            )
+        except Exception as e:
+            logger.exception(f"Error getting embeddings: {str(e)}")
+            results = [(None, 0)] * len(documents)
+        set_progress(stage="done", chunks_embedded=chunks_total)
 
+        responses = []
+        for document, (embeddings, reused_chunks) in zip(documents, results):
+            if embeddings is None:
+                responses.append(
+                    self._error_response(
+                        document.document_id,
+                        EMBEDDING_ERROR_MESSAGE,
+                        document.start_time,
+                        document.ocr_counter,
+                    )
+                )
+                continue
             try:
-                result = json.loads(response)
-                if isinstance(result, list):
-                    return [item.strip() for item in result if item.strip()]
-            except json.JSONDecodeError:
-                logger.warning("LLM response is not valid JSON, using fallback")
-                # Fallback к простому разделению
-                return await process_text(" ".join(data))
+                responses.append(
+                    await self._finish_document(document, embeddings, reused_chunks)
+                )
+            except Exception as e:
+                logger.exception(
+                    f"Error processing document {document.document_id}: {str(e)}"
+                )
+                responses.append(
+                    self._error_response(
+                        document.document_id,
+                        f"{PROCESSING_ERROR_MESSAGE}: {str(e)}",
+                        document.start_time,
+                        document.ocr_counter,
+                    )
+                )
+        return responses
 
-        except Exception as e:
-            logger.error(f"Error processing table with LLM: {e}")
-            # Fallback к простому разделению
-            return await process_text(" ".join(data))
+    async def _finish_document(
+        self,
+        document: ExtractedDocument,
+        embeddings: np.ndarray,
+        reused_chunks: int,
+    ) -> DocumentResponse:
+        texts = document.texts
+        if document.fingerprint is not None:
+            await asyncio.to_thread(
+                self.result_store.save,
+                document.document_id,
+                document.fingerprint,
+                self.config.EMBEDDER_MODEL,
+                texts,
+                embeddings,
+            )
+
+        processing_time = time.time() - document.start_time
+        logger.info(
+            f"Document processing completed successfully. Chunks: {len(texts)}, Time: {processing_time:.2f}s"
+        )
+
+        response = DocumentResponse(
+            status=Status.SUCCESS,
+            message="Document processed successfully",
+            document_id=document.document_id,
+            texts=texts,
+            chunks_count=len(texts),
+            processing_time=processing_time,
+            ocr_cache_hits=document.ocr_counter.hits,
+            ocr_cache_misses=document.ocr_counter.misses,
+            cached=False,
+            reused_chunks=reused_chunks,
+        )
+        return pack_embeddings(response, embeddings, document.embedding_format)
 
-    async def _split_by_llm(self, data: List[str], batch_size: int) -> List[str]:
+    async def _split_by_llm(
+        self, split_chain: LLMChain, data: List[str], batch_size: int
+    ) -> List[str]:
         """
-        Разделяет документ на смысловые части с помощью LLM
+        Разделяет документ на смысловые части с помощью LLM.
+        Сегменты обрабатываются параллельно, порядок частей сохраняется
         """
-        try:
-            responses = []
-            for full_text in data:
-                response = await self.split_chain.apredict(text=full_text)
-                responses.append(response)
-
-            parsing_result = []
-            for response in responses:
-                try:
-                    result = json.loads(response)
-                    if isinstance(result, list):
-                        parsing_result.extend(
-                            [item.strip() for item in result if item.strip()]
-                        )
-                except json.JSONDecodeError:
-                    logger.warning("LLM response is not valid JSON, using fallback")
-                    # Fallback к простому разделению
-                    return await process_text(" ".join(data), batch_size)
-            return parsing_result
+        # LLM получает сегменты по умолчанию не длиннее 3000 символов
+        segments = [segment for text in data for segment in await process_text(text)]
+        semaphore = asyncio.Semaphore(self.config.LLM_SPLIT_CONCURRENCY)
+        results = await asyncio.gather(
+            *[
+                self._split_segment(split_chain, text, batch_size, semaphore)
+                for text in segments
+            ]
+        )
+        return [part for parts in results for part in parts]
 
-        except Exception as e:
-            logger.error(f"Error splitting with LLM: {e}")
-            # Fallback к простому разделению
-            return await process_text(" ".join(data), batch_size)
+    async def _split_segment(
+        self,
+        split_chain: LLMChain,
+        text: str,
+        batch_size: int,
+        semaphore: asyncio.Semaphore,
+    ) -> List[str]:
+        """
+        Разделяет один сегмент с помощью LLM, повторяя запрос при ошибке или
+        невалидном ответе. Если все попытки неудачны, сегмент делится по размеру
+        """
+        max_retries = self.config.LLM_SPLIT_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            try:
+                async with semaphore:
+                    response = await split_chain.apredict(text=text)
+                result = json.loads(response)
+                if not isinstance(result, list):
+                    raise ValueError("LLM response is not a JSON list")
+                return [str(item).strip() for item in result if str(item).strip()]
+            except Exception as e:
+                if attempt == max_retries:
+                    logger.warning(
+                        f"Error splitting segment with LLM: {e}, using fallback"
+                    )
+                    break
+                delay = self.config.LLM_SPLIT_RETRY_BACKOFF * 2**attempt
+                logger.warning(
+                    f"LLM split attempt {attempt + 1} failed: {e}, "
+                    f"retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
+
+        # Fallback к простому разделению только этого сегмента
+        return await process_text(text, batch_size)
 
     async def _split_by_batch(self, data: List[str], batch_size: int) -> List[str]:
         """
         Разделяет документ на части по размеру
         """
-        full_text = " ".join(data)
-        return await process_text(full_text, batch_size)
+        full_text = data[0] if len(data) == 1 else " ".join(data)
+        return await process_text(
+            full_text,
+            batch_size,
+            max_tokens=self.config.CHUNK_MAX_TOKENS or None,
+            overlap_tokens=self.config.CHUNK_OVERLAP_TOKENS,
+        )
+
+    async def _reuse_previous(
+        self, document_id: str, texts: List[str]
+    ) -> Tuple[Optional[np.ndarray], List[int]]:
+        """
+        Переносит эмбеддинги совпавших чанков из предыдущей версии документа.
+        Возвращает частично заполненную матрицу (None, если переносить нечего)
+        и номера чанков, которые нужно закодировать
+        """
+        previous = None
+        if self.result_store is not None:
+            previous = await asyncio.to_thread(self.result_store.latest, document_id)
+        if (
+            previous is None
+            or previous.embedder_model != self.config.EMBEDDER_MODEL
+            or not previous.texts
+            or previous.embeddings.ndim != 2
+            or previous.embeddings.shape[1] == 0
+        ):
+            # Пустая предыдущая версия не задает размерность эмбеддингов
+            return None, list(range(len(texts)))
+
+        known = {chunk_hash(text): i for i, text in enumerate(previous.texts)}
+        rows = [known.get(chunk_hash(text)) for text in texts]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        logger.info(
+            f"Reusing {len(texts) - len(missing)} of {len(texts)} chunk embeddings "
+            f"from previous version of document {document_id}"
+        )
+
+        embeddings = np.empty(
+            (len(texts), previous.embeddings.shape[1]), dtype="float32"
+        )
+        reused = [i for i, row in enumerate(rows) if row is not None]
+        embeddings[reused] = previous.embeddings[[rows[i] for i in reused]]
+        advance_progress("chunks_embedded", len(reused))
+        return embeddings, missing
 
-    async def _get_embeddings(self, texts: List[str]) -> Optional[List[List[float]]]:
+    async def _get_embeddings_incremental(
+        self, documents: List[Tuple[str, List[str]]]
+    ) -> List[Tuple[Optional[np.ndarray], int]]:
         """
-        Получает эмбеддинги для списка текстов
+        Получает эмбеддинги чанков документов (document_id, texts), переиспользуя
+        чанки их предыдущих версий. Новые и измененные чанки всех документов
+        кодируются одним вызовом модели общими батчами. Ошибка одного документа
+        не влияет на остальные, весь батч отменяет только ошибка кодирования
+        """
+        reused = []
+        for document_id, texts in documents:
+            try:
+                reused.append(await self._reuse_previous(document_id, texts))
+            except Exception as e:
+                # Переиспользование - оптимизация: документ кодируется целиком
+                logger.exception(
+                    f"Error reusing embeddings of document {document_id}: {str(e)}"
+                )
+                reused.append((None, list(range(len(texts)))))
+        pending = [
+            texts[i]
+            for (_, texts), (_, missing) in zip(documents, reused)
+            for i in missing
+        ]
+        encoded = await self._get_embeddings(pending)
+        if encoded is None:
+            return [(None, 0)] * len(documents)
+
+        results = []
+        offset = 0
+        for (document_id, texts), (embeddings, missing) in zip(documents, reused):
+            rows = encoded[offset : offset + len(missing)]
+            offset += len(missing)
+            try:
+                if embeddings is None:
+                    # Переносить нечего: все чанки закодированы по порядку
+                    embeddings = rows
+                elif missing:
+                    embeddings[missing] = rows
+            except Exception as e:
+                logger.exception(
+                    f"Error merging embeddings of document {document_id}: {str(e)}"
+                )
+                results.append((None, 0))
+                continue
+            results.append((embeddings, len(texts) - len(missing)))
+        return results
+
+    async def _get_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Получает матрицу эмбеддингов float32 для списка текстов
         """
         try:
-            embeddings = self.embedder.encode(texts, normalize_embeddings=True).tolist()
+            if self.embedding_cache is None:
+                embeddings = await self.encoder.encode(texts)
+                logger.info("Succefully embedded text")
+                return embeddings
+
+            # Модель запускается только для чанков, которых нет в кэше
+            keys = [EmbeddingCache.key(text) for text in texts]
+            vectors = await asyncio.to_thread(self.embedding_cache.get_many, keys)
+            missing = {}
+            for i, vector in enumerate(vectors):
+                if vector is None:
+                    missing.setdefault(keys[i], texts[i])
+            hits = len(texts) - sum(vector is None for vector in vectors)
+            advance_progress("chunks_embedded", hits)
+            logger.info(
+                f"Embedding cache: {hits} hits, {len(missing)} unique texts to encode"
+            )
+            if missing:
+                encoded = await self.encoder.encode(list(missing.values()))
+                await asyncio.to_thread(
+                    self.embedding_cache.put_many, list(missing.keys()), encoded
+                )
+                encoded_by_key = dict(zip(missing.keys(), encoded))
+                vectors = [
+                    vector if vector is not None else encoded_by_key[key]
+                    for key, vector in zip(keys, vectors)
+                ]
+            embeddings = (
+                np.stack(vectors).astype("float32", copy=False)
+                if vectors
+                else np.empty((0, 0), dtype="float32")
+            )
             logger.info("Succefully embedded text")
             return embeddings
         except Exception as e:
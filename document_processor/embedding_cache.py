@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+KEYS_FILE = "keys.txt"
+META_FILE = "meta.json"
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Общий для всех документов дисковый кэш эмбеддингов чанков.
+
+    Ключ - хэш нормализованного текста чанка, для каждой модели эмбеддера свой
+    каталог. Векторы дописываются в файл float32 и читаются через memory map,
+    ключи дописываются построчно в том же порядке и образуют индекс hash -> строка.
+    При превышении max_entries кэш модели очищается целиком. Файлы рассчитаны
+    на один процесс-писатель.
+    """
+
+    def __init__(self, root_dir: str, model: str, max_entries: int):
+        self.model = model
+        self.max_entries = max_entries
+        model_hash = hashlib.sha256(model.encode("utf-8")).hexdigest()[:16]
+        self.cache_dir = os.path.join(root_dir, model_hash)
+        self._vectors_path = os.path.join(self.cache_dir, VECTORS_FILE)
+        self._keys_path = os.path.join(self.cache_dir, KEYS_FILE)
+        self._meta_path = os.path.join(self.cache_dir, META_FILE)
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+        logger.info(
+            f"Initialized embedding cache in {self.cache_dir} "
+            f"({len(self._index)} vectors)"
+        )
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def _load(self):
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self._dim = json.load(f)["dim"]
+            with open(self._keys_path, "r") as f:
+                keys = f.read().split()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Failed to load embedding cache, resetting: {e}")
+            self._reset()
+            return
+        # После сбоя во время записи файлы могут разойтись по длине, обрезаем
+        # оба до числа полных пар ключ-вектор
+        vectors_size = (
+            os.path.getsize(self._vectors_path)
+            if os.path.exists(self._vectors_path)
+            else 0
+        )
+        rows = min(len(keys), vectors_size // (self._dim * 4))
+        if rows < len(keys):
+            with open(self._keys_path, "w") as f:
+                f.write("".join(f"{key}\n" for key in keys[:rows]))
+        if vectors_size > rows * self._dim * 4:
+            os.truncate(self._vectors_path, rows * self._dim * 4)
+        self._index = {key: row for row, key in enumerate(keys[:rows])}
+
+    def _reset(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index = {}
+        self._dim = None
+        self._matrix = None
+
+    def _rows(self) -> np.memmap:
+        # Файл только дописывается, поэтому отображение пересоздаем при росте
+        rows = len(self._index)
+        if self._matrix is None or self._matrix.shape[0] < rows:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype="float32", mode="r", shape=(rows, self._dim)
+            )
+        return self._matrix
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Возвращает сохраненные векторы по ключам, None для промахов
+        """
+        with self._lock:
+            rows = [self._index.get(key) for key in keys]
+            found = [row for row in rows if row is not None]
+            self.hits += len(found)
+            self.misses += len(rows) - len(found)
+            if not found:
+                return [None] * len(keys)
+            matrix = self._rows()
+            return [np.array(matrix[row]) if row is not None else None for row in rows]
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        with self._lock:
+            if self._dim is not None and vectors.shape[1] != self._dim:
+                logger.warning(
+                    f"Embedding dimension changed from {self._dim} to "
+                    f"{vectors.shape[1]}, resetting cache"
+                )
+                self._reset()
+            if len(self._index) + len(keys) > self.max_entries:
+                logger.info(
+                    f"Embedding cache is full ({len(self._index)} vectors), resetting"
+                )
+                self._reset()
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model, "dim": self._dim}, f)
+
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._index and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+            # Сначала векторы, потом ключи; рассинхронизация после сбоя
+            # исправляется при загрузке
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.stack(list(new.values())).tobytes())
+            with open(self._keys_path, "a") as f:
+                f.write("".join(f"{key}\n" for key in new))
+            for key in new:
+                self._index[key] = len(self._index)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
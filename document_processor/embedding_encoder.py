@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from progress import advance_progress
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEncoder:
+    """
+    Кодирует чанки документа вне event loop.
+
+    Тексты сортируются по длине и режутся на батчи по batch_size, чтобы в батче
+    было меньше паддинга, батчи выполняются в пуле из threads потоков. Если текстов
+    не меньше multiprocess_min_texts и processes > 0, кодирование идет через
+    многопроцессный пул sentence-transformers на нескольких ядрах CPU.
+    """
+
+    def __init__(
+        self,
+        embedder: SentenceTransformer,
+        batch_size: int = 64,
+        threads: int = 1,
+        processes: int = 0,
+        multiprocess_min_texts: int = 5000,
+    ):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.processes = processes
+        self.multiprocess_min_texts = multiprocess_min_texts
+        self._executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="embedding"
+        )
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.embedder.encode(
+            texts, batch_size=len(texts), normalize_embeddings=True
+        )
+
+    def _encode_multi_process(self, texts: List[str]) -> np.ndarray:
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                logger.info(f"Starting {self.processes} embedding processes")
+                self._process_pool = self.embedder.start_multi_process_pool(
+                    target_devices=["cpu"] * self.processes
+                )
+        return self.embedder.encode_multi_process(
+            texts,
+            self._process_pool,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+        )
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Возвращает нормализованные эмбеддинги в порядке входных текстов
+        """
+        loop = asyncio.get_running_loop()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+
+        if self.processes > 0 and len(texts) >= self.multiprocess_min_texts:
+            logger.info(f"Encoding {len(texts)} chunks in {self.processes} processes")
+            encoded = await loop.run_in_executor(
+                self._executor, self._encode_multi_process, sorted_texts
+            )
+            advance_progress("chunks_embedded", len(texts))
+        else:
+            batches = [
+                sorted_texts[start : start + self.batch_size]
+                for start in range(0, len(sorted_texts), self.batch_size)
+            ]
+            futures = [
+                loop.run_in_executor(self._executor, self._encode_batch, batch)
+                for batch in batches
+            ]
+            done = 0
+            try:
+                for future in asyncio.as_completed(futures):
+                    batch_size = len(await future)
+                    done += batch_size
+                    advance_progress("chunks_embedded", batch_size)
+                    logger.info(f"Embedded {done}/{len(texts)} chunks")
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            # Порядок батчей в futures совпадает с порядком в sorted_texts
+            encoded = (
+                np.concatenate([future.result() for future in futures])
+                if futures
+                else np.empty((0, 0), dtype="float32")
+            )
+
+        result = np.empty_like(encoded)
+        result[order] = encoded
+        return result
+
+    def shutdown(self):
+        if self._process_pool is not None:
+            self.embedder.stop_multi_process_pool(self._process_pool)
+            self._process_pool = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import multiprocessing
+import resource
+from multiprocessing.connection import Connection
+from typing import Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def _limit_memory(memory_limit_bytes: int):
+    # При превышении лимита аллокация завершается MemoryError внутри задачи,
+    # а не OOM всего контейнера
+    if memory_limit_bytes > 0:
+        resource.setrlimit(
+            resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes)
+        )
+
+
+def _run_task(connection: Connection, memory_limit_bytes: int, func, args):
+    # Выполняется в дочернем процессе: результат или исключение задачи
+    # отправляется родителю через pipe
+    _limit_memory(memory_limit_bytes)
+    try:
+        outcome = (True, func(*args))
+    except BaseException as e:
+        outcome = (False, e)
+    try:
+        connection.send(outcome)
+    except Exception as e:
+        # Результат или исключение задачи не сериализуются
+        connection.send((False, RuntimeError(f"{func.__name__} failed: {e}")))
+    finally:
+        connection.close()
+
+
+async def _wait_readable(connection: Connection, timeout: float) -> bool:
+    """
+    Ждет данных или закрытия pipe не дольше timeout, не занимая поток
+    """
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    fd = connection.fileno()
+
+    def on_readable():
+        loop.remove_reader(fd)
+        if not readable.done():
+            readable.set_result(True)
+
+    loop.add_reader(fd, on_readable)
+    try:
+        return await asyncio.wait_for(readable, timeout=timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+
+
+class ExtractionPool:
+    """
+    Процессы для CPU-тяжелого извлечения текста и подготовки изображений.
+
+    Каждая задача выполняется в отдельном процессе, который ответвляется от
+    forkserver с заранее импортированным модулем экстракторов, одновременно
+    работает не больше processes задач. Задача, не уложившаяся в timeout,
+    завершается вместе со своим процессом, остальные задачи не затрагиваются.
+    Каждый процесс ограничен memory_limit_bytes адресного пространства.
+    При processes = 0 функции выполняются в потоках без изоляции.
+    """
+
+    def __init__(self, processes: int, timeout: float, memory_limit_bytes: int = 0):
+        self.processes = processes
+        self.timeout = timeout
+        self.memory_limit_bytes = memory_limit_bytes
+        self._context = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._running: Set[multiprocessing.Process] = set()
+
+    def _get_context(self):
+        if self._context is None:
+            # forkserver не копирует потоки и состояние сервиса в процессы задач,
+            # в сервере заранее импортируется только модуль экстракторов
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(["extractors"])
+            self._semaphore = asyncio.Semaphore(self.processes)
+            logger.info(f"Started extraction pool with {self.processes} processes")
+        return self._context
+
+    async def run(self, func: Callable, *args):
+        """
+        Выполняет func(*args) в отдельном процессе и возвращает результат
+        """
+        if self.processes <= 0:
+            return await asyncio.wait_for(
+                asyncio.to_thread(func, *args), timeout=self.timeout
+            )
+
+        context = self._get_context()
+        async with self._semaphore:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_run_task,
+                args=(sender, self.memory_limit_bytes, func, args),
+                daemon=True,
+            )
+            try:
+                process.start()
+                self._running.add(process)
+                # У процесса своя копия sender: EOF придет, когда он завершится
+                sender.close()
+                if not await _wait_readable(receiver, self.timeout):
+                    logger.error(
+                        f"{func.__name__} timed out after {self.timeout}s, "
+                        f"killing its process"
+                    )
+                    raise TimeoutError(
+                        f"{func.__name__} timed out after {self.timeout}s"
+                    )
+                try:
+                    ok, value = await asyncio.to_thread(receiver.recv)
+                except asyncio.CancelledError:
+                    # pipe еще читается в потоке и закроется вместе с объектом
+                    receiver = None
+                    raise
+                except EOFError:
+                    # Процесс завершился, не отправив результат (OOM killer, сигнал)
+                    raise ChildProcessError(f"{func.__name__} process exited")
+            finally:
+                sender.close()
+                if process.pid is not None:
+                    self._running.discard(process)
+                    if process.is_alive():
+                        process.kill()
+                    process.join()
+                    process.close()
+                if receiver is not None:
+                    receiver.close()
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self):
+        for process in list(self._running):
+            process.kill()
+        self._running.clear()
@@ -0,0 +1,66 @@
+# CPU-тяжелые функции извлечения, выполняемые в процессах ExtractionPool.
+# Модуль импортируется в дочерних процессах, поэтому не тянет за собой
+# настройки сервиса, модели и клиентов
+import logging
+from io import BytesIO
+from typing import List, Optional, Union
+
+import mammoth
+from docx import Document
+from PIL import Image
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+def docx_text(docx_path: str) -> str:
+    doc = Document(docx_path)
+    return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+
+
+def doc_text(doc_path: str) -> str:
+    with open(doc_path, "rb") as f:
+        return mammoth.extract_raw_text(f).value
+
+
+def pdf_text_layer(pdf_path: str) -> Optional[List[Optional[str]]]:
+    """
+    Извлекает встроенный текстовый слой постранично, None для страниц, текст
+    которых не извлекся, и None вместо списка, если PDF не читается
+    """
+    try:
+        reader = PdfReader(pdf_path)
+        pages = []
+        for page in reader.pages:
+            try:
+                pages.append(page.extract_text())
+            except Exception as e:
+                logger.warning(f"Failed to extract PDF text layer from page: {e}")
+                pages.append(None)
+        return pages
+    except Exception as e:
+        logger.warning(f"Failed to read PDF text layer: {e}")
+        return None
+
+
+def image_to_jpeg(
+    image: Union[str, Image.Image], max_height: Optional[int] = None
+) -> bytes:
+    """
+    Декодирует изображение (путь к файлу или PIL.Image), приводит к RGB,
+    уменьшает до max_height по высоте и кодирует в JPEG
+    """
+    if isinstance(image, str):
+        image = Image.open(image)
+        image.load()
+    if image.mode in ("RGBA", "P", "LA"):
+        image = image.convert("RGB")
+
+    width, height = image.size
+    if max_height and height > max_height:
+        ratio = max_height / float(height)
+        image = image.resize((int(width * ratio), max_height), Image.LANCZOS)
+
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG")
+    return buffered.getvalue()
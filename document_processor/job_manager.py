@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from config.contracts import (
+    DocumentRequest,
+    DocumentResponse,
+    JobProgress,
+    JobResponse,
+    JobStatus,
+    Status,
+)
+from document_pipeline import DocumentPipeline
+from progress import processing_progress
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE = "job.json"
+REQUEST_FILE = "request.json"
+INPUT_FILE = "input.bin"
+RESULT_FILE = "result.json"
+EMBEDDINGS_FILE = "embeddings.bin"
+
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobManager:
+    """
+    Асинхронная обработка документов через очередь заданий.
+
+    Задание, файл и параметры запроса сохраняются в каталоге root_dir/<job_id>,
+    поэтому после перезапуска сервиса незавершенные задания снова ставятся в очередь.
+    Очередь разбирают workers фоновых задач, готовые задания хранятся
+    result_ttl_seconds и затем удаляются.
+    """
+
+    def __init__(
+        self,
+        pipeline: DocumentPipeline,
+        root_dir: str,
+        workers: int = 2,
+        result_ttl_seconds: float = 86400,
+    ):
+        self.pipeline = pipeline
+        self.root_dir = root_dir
+        self.workers = workers
+        self.result_ttl_seconds = result_ttl_seconds
+        self._jobs: Dict[str, JobResponse] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks = []
+        self._closing = False
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root_dir, str(job_id))
+
+    def _write(self, job_id: str, name: str, data):
+        path = os.path.join(self._job_dir(job_id), name)
+        tmp_path = f"{path}.tmp"
+        mode = "wb" if isinstance(data, bytes) else "w"
+        encoding = None if isinstance(data, bytes) else "utf-8"
+        with open(tmp_path, mode, encoding=encoding) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _persist(self, job: JobResponse):
+        await asyncio.to_thread(
+            self._write, str(job.job_id), JOB_FILE, job.model_dump_json()
+        )
+
+    def _remove_input(self, job_id: str):
+        try:
+            os.remove(os.path.join(self._job_dir(job_id), INPUT_FILE))
+        except FileNotFoundError:
+            pass
+
+    def _load_jobs(self):
+        jobs = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name, JOB_FILE)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    jobs.append(JobResponse.model_validate_json(f.read()))
+            except FileNotFoundError:
+                # Задание без job.json не успело поставиться в очередь
+                shutil.rmtree(os.path.join(self.root_dir, name), ignore_errors=True)
+            except Exception as e:
+                logger.error(f"Failed to load job {name}: {e}")
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    async def start(self):
+        """
+        Восстанавливает задания с диска и запускает воркеры
+        """
+        self._queue = asyncio.Queue()
+        jobs = await asyncio.to_thread(self._load_jobs)
+        requeued = 0
+        for job in jobs:
+            job_id = str(job.job_id)
+            if job.status in (JobStatus.QUEUED, JobStatus.RUNNING):
+                # Прерванное перезапуском задание выполняется заново
+                job.status = JobStatus.QUEUED
+                job.progress = JobProgress()
+                job.started_at = None
+                await self._persist(job)
+                self._queue.put_nowait(job_id)
+                requeued += 1
+            self._jobs[job_id] = job
+        await self.prune()
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        logger.info(
+            f"Job manager started: {self.workers} workers, "
+            f"{len(self._jobs)} jobs loaded, {requeued} requeued"
+        )
+
+    async def shutdown(self):
+        self._closing = True
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def submit(self, file_path: str, request: DocumentRequest) -> JobResponse:
+        """
+        Переносит файл в каталог задания, сохраняет параметры и ставит задание
+        в очередь
+        """
+        job = JobResponse(
+            job_id=uuid.uuid4(),
+            document_id=request.document_id,
+            status=JobStatus.QUEUED,
+            created_at=_now(),
+        )
+        job_id = str(job.job_id)
+
+        def save():
+            os.makedirs(self._job_dir(job_id), exist_ok=True)
+            shutil.move(file_path, os.path.join(self._job_dir(job_id), INPUT_FILE))
+            self._write(job_id, REQUEST_FILE, request.model_dump_json())
+            # job.json пишется последним: без него задание не восстанавливается
+            self._write(job_id, JOB_FILE, job.model_dump_json())
+
+        await asyncio.to_thread(save)
+        self._jobs[job_id] = job
+        self._queue.put_nowait(job_id)
+        logger.info(f"Queued job {job_id} for document {request.document_id}")
+        await self.prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[JobResponse]:
+        return self._jobs.get(str(job_id))
+
+    async def get_result(self, job_id: str) -> Optional[DocumentResponse]:
+        """
+        Возвращает результат завершенного задания или None
+        """
+        job_id = str(job_id)
+
+        def load():
+            job_dir = self._job_dir(job_id)
+            result_path = os.path.join(job_dir, RESULT_FILE)
+            try:
+                with open(result_path, "r", encoding="utf-8") as f:
+                    result = DocumentResponse.model_validate_json(f.read())
+            except FileNotFoundError:
+                return None
+            binary_path = os.path.join(job_dir, EMBEDDINGS_FILE)
+            if os.path.exists(binary_path):
+                with open(binary_path, "rb") as f:
+                    result._embeddings_binary = f.read()
+            return result
+
+        return await asyncio.to_thread(load)
+
+    async def cancel(self, job_id: str) -> Optional[JobResponse]:
+        """
+        Отменяет задание в очереди или в работе, завершенные задания не меняются
+        """
+        job = self._jobs.get(str(job_id))
+        if job is None or job.status in FINISHED_STATUSES:
+            return job
+
+        job.status = JobStatus.CANCELLED
+        job.message = "Job cancelled"
+        job.finished_at = _now()
+        task = self._running.get(str(job_id))
+        if task is not None:
+            # Состояние сохранит сама задача после обработки отмены
+            task.cancel()
+        else:
+            await self._persist(job)
+            await asyncio.to_thread(self._remove_input, str(job_id))
+        logger.info(f"Cancelled job {job_id}")
+        return job
+
+    async def prune(self):
+        """
+        Удаляет завершенные задания старше result_ttl_seconds
+        """
+        deadline = time.time() - self.result_ttl_seconds
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATUSES
+            and job.finished_at is not None
+            and job.finished_at.timestamp() < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            await asyncio.to_thread(
+                shutil.rmtree, self._job_dir(job_id), ignore_errors=True
+            )
+        if expired:
+            logger.info(f"Removed {len(expired)} expired jobs")
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != JobStatus.QUEUED:
+                continue
+            task = asyncio.create_task(self._run(job))
+            self._running[job_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                if self._closing:
+                    raise
+            except Exception as e:
+                logger.exception(f"Job {job_id} crashed: {e}")
+            finally:
+                self._running.pop(job_id, None)
+
+    def _read_input(self, job_id: str) -> Tuple[str, DocumentRequest]:
+        job_dir = self._job_dir(job_id)
+        with open(os.path.join(job_dir, REQUEST_FILE), "r", encoding="utf-8") as f:
+            request = DocumentRequest.model_validate_json(f.read())
+        return os.path.join(job_dir, INPUT_FILE), request
+
+    def _save_result(self, job_id: str, result: DocumentResponse):
+        self._write(job_id, RESULT_FILE, result.model_dump_json())
+        if result._embeddings_binary is not None:
+            self._write(job_id, EMBEDDINGS_FILE, result._embeddings_binary)
+        self._remove_input(job_id)
+
+    async def _run(self, job: JobResponse):
+        job_id = str(job.job_id)
+        job.status = JobStatus.RUNNING
+        job.started_at = _now()
+        job.progress = JobProgress()
+        await self._persist(job)
+        # Пайплайн и утилиты обновляют этот объект через contextvar
+        processing_progress.set(job.progress)
+        logger.info(f"Running job {job_id}")
+
+        try:
+            file_path, request = await asyncio.to_thread(self._read_input, job_id)
+            result = await self.pipeline.process_request(file_path, request)
+            await asyncio.to_thread(self._save_result, job_id, result)
+        except asyncio.CancelledError:
+            if job.status != JobStatus.CANCELLED:
+                # Остановка сервиса: задание выполнится после перезапуска
+                job.status = JobStatus.QUEUED
+                job.started_at = None
+                job.progress = JobProgress()
+                await asyncio.shield(self._persist(job))
+                raise
+            await asyncio.to_thread(self._remove_input, job_id)
+            await self._persist(job)
+            return
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {e}")
+            job.status = JobStatus.FAILED
+            job.message = str(e)
+            # Результат с ошибкой сохраняется, чтобы /result не отвечал 404
+            result = DocumentResponse(
+                status=Status.ERROR,
+                message=str(e),
+                document_id=job.document_id,
+                texts=[],
+                embeddings=[],
+                chunks_count=0,
+                processing_time=(_now() - job.started_at).total_seconds(),
+            )
+            try:
+                await asyncio.to_thread(self._save_result, job_id, result)
+            except Exception as save_error:
+                logger.error(f"Failed to save result of job {job_id}: {save_error}")
+        else:
+            if result.status == Status.SUCCESS:
+                job.status = JobStatus.COMPLETED
+            else:
+                job.status = JobStatus.FAILED
+                job.message = result.message
+
+        job.finished_at = _now()
+        await self._persist(job)
+        logger.info(f"Job {job_id} finished with status {job.status.value}")
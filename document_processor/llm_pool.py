@@ -0,0 +1,74 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List
+
+import httpx
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPool:
+    """
+    Пул цепочек разделения документов, переиспользуемых между запросами.
+
+    Цепочки ключуются по (model, temperature, хэш промпта) и вытесняются по LRU
+    при превышении max_size. Все клиенты работают через один httpx.AsyncClient
+    с keep-alive, поэтому соединения не создаются заново на каждый документ.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        max_size: int = 32,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_size = max_size
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            )
+        )
+        self._chains = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_chain(
+        self,
+        model: str,
+        temperature: float,
+        template: str,
+        input_variables: List[str],
+    ) -> LLMChain:
+        key = (model, temperature, hashlib.sha256(template.encode("utf-8")).hexdigest())
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is not None:
+                self._chains.move_to_end(key)
+                return chain
+
+            logger.info(f"Creating LLM chain for {model} (temperature={temperature})")
+            llm = ChatOpenAI(
+                openai_api_key=self.api_key,
+                model_name=model,
+                temperature=temperature,
+                base_url=self.base_url,
+                http_async_client=self.http_client,
+            )
+            prompt = PromptTemplate(input_variables=input_variables, template=template)
+            chain = LLMChain(llm=llm, prompt=prompt)
+            self._chains[key] = chain
+            while len(self._chains) > self.max_size:
+                self._chains.popitem(last=False)
+            return chain
+
+    async def aclose(self):
+        await self.http_client.aclose()
@@ -2,12 +2,25 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from router import router
+from router import router, app_config, document_pipeline, job_manager
 from config.logger import setup_logging
+from utils import close_extraction_pool, close_ocr_client
+from uploads import remove_spooled_files
+from request_limits import RequestSizeLimitMiddleware
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Запас на поля формы и заголовки multipart сверх размера файлов
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+def request_max_bytes(path: str) -> int:
+    if path.endswith("/documents/batch"):
+        return app_config.BATCH_MAX_BYTES + FORM_OVERHEAD_BYTES
+    return app_config.UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES
+
+
 app = FastAPI(
     title="Document Processor Service",
     version="1.0.0",
@@ -16,6 +29,8 @@ app = FastAPI(
     redoc_url=None,
 )
 
+# Добавляется до CORS, чтобы ответ 413 тоже получал CORS-заголовки
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=request_max_bytes)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,11 +47,20 @@ logger.info("Document Processor Service initialized successfully")
 @app.on_event("startup")
 async def startup_event():
     logger.info("Document Processor Service starting up...")
+    removed = remove_spooled_files(app_config.UPLOAD_TMP_DIR)
+    if removed:
+        logger.info(f"Removed {removed} stale upload files")
+    await job_manager.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Document Processor Service shutting down...")
+    await job_manager.shutdown()
+    await document_pipeline.llm_pool.aclose()
+    document_pipeline.encoder.shutdown()
+    await close_ocr_client()
+    close_extraction_pool()
 
 
 if __name__ == "__main__":
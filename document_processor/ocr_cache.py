@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OcrCacheCounter:
+    """
+    Счетчики попаданий и промахов кэша OCR в рамках обработки одного документа
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+
+# Счетчик текущего документа; задачи asyncio наследуют его из контекста запроса
+ocr_cache_counter: ContextVar[Optional[OcrCacheCounter]] = ContextVar(
+    "ocr_cache_counter", default=None
+)
+
+
+class OcrCache:
+    """
+    Контентно-адресуемый дисковый кэш результатов OCR.
+
+    Ключ - хэш байтов изображения страницы вместе с моделью и промптом OCR.
+    Каждый результат хранится в отдельном файле, при превышении max_bytes
+    удаляются давно не читавшиеся записи (по mtime).
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._scan())
+        logger.info(
+            f"Initialized OCR cache in {self.root_dir} ({self._total_bytes} bytes)"
+        )
+
+    @staticmethod
+    def make_key(image_bytes: bytes, model: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], key + ".txt")
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            # Обновляем mtime, чтобы запись считалась недавно использованной
+            os.utime(path)
+            return text
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, text: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._total_bytes -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._scan(), key=lambda entry: entry[1])
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, _, size in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._total_bytes -= size
+            removed += 1
+        logger.info(f"Evicted {removed} OCR cache entries")
@@ -0,0 +1,22 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from config.contracts import JobProgress
+
+# Прогресс текущего задания; задачи asyncio наследуют его из контекста задания
+processing_progress: ContextVar[Optional[JobProgress]] = ContextVar(
+    "processing_progress", default=None
+)
+
+
+def set_progress(**values):
+    progress = processing_progress.get()
+    if progress is not None:
+        for name, value in values.items():
+            setattr(progress, name, value)
+
+
+def advance_progress(name: str, count: int = 1):
+    progress = processing_progress.get()
+    if progress is not None:
+        setattr(progress, name, getattr(progress, name) + count)
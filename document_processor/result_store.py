@@ -0,0 +1,158 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_FILE = "chunks.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "meta.json"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class StoredResult(NamedTuple):
+    fingerprint: str
+    embedder_model: str
+    texts: List[str]
+    embeddings: np.ndarray
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    Дисковое хранилище готовых результатов обработки документов.
+
+    Результат адресуется отпечатком: хэшем байтов файла вместе с параметрами
+    обработки, поэтому повторный идентичный запрос не пересчитывается. Для каждого
+    document_id запоминается отпечаток последней версии, чтобы при изменении
+    документа переиспользовать эмбеддинги неизменившихся чанков. При превышении
+    max_entries удаляются давно не использовавшиеся результаты.
+    """
+
+    def __init__(self, root_dir: str, max_entries: int):
+        self.root_dir = root_dir
+        self.max_entries = max_entries
+        self._results_dir = os.path.join(root_dir, "results")
+        self._documents_dir = os.path.join(root_dir, "documents")
+        self._lock = threading.Lock()
+        os.makedirs(self._results_dir, exist_ok=True)
+        os.makedirs(self._documents_dir, exist_ok=True)
+        logger.info(f"Initialized result store in {self.root_dir}")
+
+    @staticmethod
+    def fingerprint(file_path: str, params: Dict) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        digest.update(b"\0")
+        digest.update(json.dumps(params, ensure_ascii=False, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _result_dir(self, fingerprint: str) -> str:
+        return os.path.join(self._results_dir, fingerprint)
+
+    def get(self, fingerprint: str) -> Optional[StoredResult]:
+        """
+        Возвращает сохраненный результат по отпечатку или None
+        """
+        result_dir = self._result_dir(fingerprint)
+        try:
+            with open(os.path.join(result_dir, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            chunks_path = os.path.join(result_dir, CHUNKS_FILE)
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                texts = json.load(f)
+            embeddings = np.load(os.path.join(result_dir, EMBEDDINGS_FILE))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Failed to load stored result {fingerprint}: {e}")
+            return None
+        # Обновляем mtime, чтобы результат считался недавно использованным;
+        # каталог мог быть вытеснен параллельно, данные уже прочитаны
+        with contextlib.suppress(OSError):
+            os.utime(result_dir)
+        return StoredResult(fingerprint, meta["embedder_model"], texts, embeddings)
+
+    def latest(self, document_id: str) -> Optional[StoredResult]:
+        """
+        Возвращает результат последней обработанной версии документа
+        """
+        try:
+            with open(os.path.join(self._documents_dir, str(document_id)), "r") as f:
+                fingerprint = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return self.get(fingerprint)
+
+    def save(
+        self,
+        document_id: str,
+        fingerprint: str,
+        embedder_model: str,
+        texts: List[str],
+        embeddings: List[List[float]],
+    ):
+        result_dir = self._result_dir(fingerprint)
+        tmp_dir = f"{result_dir}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, CHUNKS_FILE), "w", encoding="utf-8") as f:
+            json.dump(texts, f, ensure_ascii=False)
+        np.save(
+            os.path.join(tmp_dir, EMBEDDINGS_FILE),
+            np.asarray(embeddings, dtype="float32"),
+        )
+        # meta.json пишется последним: без него результат считается отсутствующим
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"embedder_model": embedder_model}, f)
+
+        with self._lock:
+            if os.path.isdir(result_dir):
+                shutil.rmtree(tmp_dir)
+            else:
+                os.replace(tmp_dir, result_dir)
+            self._link(document_id, fingerprint)
+            self._prune()
+
+        logger.info(
+            f"Stored result {fingerprint} for document {document_id} "
+            f"({len(texts)} chunks)"
+        )
+
+    def link(self, document_id: str, fingerprint: str):
+        """
+        Отмечает результат как последнюю версию документа
+        """
+        with self._lock:
+            self._link(document_id, fingerprint)
+
+    def _link(self, document_id: str, fingerprint: str):
+        pointer_tmp = os.path.join(self._documents_dir, f"{document_id}.tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(fingerprint)
+        os.replace(pointer_tmp, os.path.join(self._documents_dir, str(document_id)))
+
+    def _prune(self):
+        entries = []
+        for name in os.listdir(self._results_dir):
+            path = os.path.join(self._results_dir, name)
+            if name.endswith(".tmp") or not os.path.isdir(path):
+                continue
+            entries.append((os.stat(path).st_mtime, path))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[: len(entries) - self.max_entries]:
+            shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Pruned {len(entries) - self.max_entries} stored results")
@@ -1,14 +1,48 @@
+import asyncio
 import logging
+import os
+import time
+import uuid
+import zipfile
+from typing import List, Optional, Tuple
 from uuid import UUID
 from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from config.contracts import DocumentResponse, SplitMethod
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi.responses import Response
+from config.app_settings import AppConfig
+from config.contracts import (
+    BatchDocumentResponse,
+    BatchResponse,
+    DocumentRequest,
+    DocumentResponse,
+    EmbeddingFormat,
+    JobResponse,
+    JobStatus,
+    SplitMethod,
+    Status,
+)
 from document_pipeline import DocumentPipeline
+from job_manager import JobManager
+from uploads import (
+    TooManyFiles,
+    UploadTooLarge,
+    process_spool_dir,
+    remove_file,
+    spool_file,
+    unpack_archive,
+)
 from config.constants import DOCUMENT_SPLIT_PROMPT, TABLE_PROCESSING_PROMPT
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-document_pipeline = DocumentPipeline()
+app_config = AppConfig()
+document_pipeline = DocumentPipeline(app_config)
+job_manager = JobManager(
+    document_pipeline,
+    app_config.JOB_STORE_DIR,
+    workers=app_config.JOB_WORKERS,
+    result_ttl_seconds=app_config.JOB_RESULT_TTL_SECONDS,
+)
 
 
 @router.get("/")
@@ -23,10 +57,38 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
 
-@router.post("/documents/process", response_model=DocumentResponse)
-async def process_document(
-    document_id: UUID = Form(..., description="Уникальный идентификатор документа"),
-    document: UploadFile = File(..., description="Загружаемый файл"),
+@router.get("/stats")
+async def stats():
+    logger.info("Stats endpoint accessed")
+    embedding_cache = document_pipeline.embedding_cache
+    return {
+        "embedding_cache": (
+            embedding_cache.stats() if embedding_cache is not None else None
+        ),
+    }
+
+
+def _multipart_response(result: DocumentResponse) -> Response:
+    """
+    Ответ multipart/mixed: JSON DocumentResponse и эмбеддинги float32
+    отдельной частью application/octet-stream
+    """
+    boundary = uuid.uuid4().hex
+    payload = result._embeddings_binary or b""
+    body = b"".join(
+        [
+            f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode(),
+            result.model_dump_json().encode("utf-8"),
+            f"\r\n--{boundary}\r\nContent-Type: application/octet-stream\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode(),
+            payload,
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+    )
+    return Response(content=body, media_type=f"multipart/mixed; boundary={boundary}")
+
+
+async def processing_form(
     split_method: SplitMethod = Form(
         default=SplitMethod.BATCH,
         description="Метод разбиения текста: 'llm' или 'batch'",
@@ -49,68 +111,121 @@ async def process_document(
     prompt_table: str = Form(
         default=TABLE_PROCESSING_PROMPT, description="Промпт для обработки таблиц"
     ),
-):
+    embedding_format: EmbeddingFormat = Form(
+        default=EmbeddingFormat.JSON,
+        description="Формат эмбеддингов: json, base64_float32, base64_float16 "
+        "или binary (multipart/mixed с частью application/octet-stream)",
+    ),
+) -> dict:
     """
-    Обрабатывает документ и возвращает фрагменты текста с эмбеддингами
+    Параметры обработки из полей формы, общие для одного документа и пакета
 
     Args:
-        document_id: UUID документа
-        document: Загружаемый файл
         split_method: Метод разделения ("llm" или "batch")
         batch_size: Размер батча (игнорируется для "llm" и таблиц)
         llm_model: Модель LLM для разделения
         temperature: Температура для LLM
         prompt_split: Кастомный промпт для разделения
         prompt_table: Кастомный промпт для таблиц
+        embedding_format: Формат эмбеддингов в ответе
+    """
+    return {
+        "split_method": split_method,
+        "batch_size": batch_size,
+        "llm_model": llm_model,
+        "temperature": temperature,
+        "prompt_split": prompt_split,
+        "prompt_table": prompt_table,
+        "embedding_format": embedding_format,
+    }
 
-    Returns:
-        DocumentResponse с фрагментами текста и эмбеддингами
+
+async def document_form(
+    document_id: UUID = Form(..., description="Уникальный идентификатор документа"),
+    options: dict = Depends(processing_form),
+) -> DocumentRequest:
+    """
+    Параметры обработки документа из полей формы
+    """
+    return DocumentRequest(document_id=document_id, **options)
+
+
+async def _spool_upload(document: UploadFile) -> str:
+    """
+    Копирует загруженный файл во временный файл на диске, не читая его в память
+    целиком, и возвращает путь. Файл больше UPLOAD_MAX_BYTES отклоняется
     """
+    logger.info(f"Spooling file: {document.filename}")
     try:
-        logger.info(f"Processing document request for document_id: {str(document_id)}")
+        file_path = await asyncio.to_thread(
+            spool_file,
+            document.file,
+            process_spool_dir(app_config.UPLOAD_TMP_DIR),
+            app_config.UPLOAD_MAX_BYTES,
+            document.filename or "File",
+        )
+    except UploadTooLarge as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=413, detail=str(e))
 
-        try:
-            split_enum = SplitMethod(split_method)
-        except ValueError:
-            logger.error(f"Invalid split_method: {split_method}")
-            raise HTTPException(
-                status_code=400, detail="split_method must be either 'llm' or 'batch'"
-            )
+    if os.path.getsize(file_path) == 0:
+        remove_file(file_path)
+        logger.error("Empty file received")
+        raise HTTPException(status_code=400, detail="File is empty")
+    return file_path
 
-        # Читаем файл
-        logger.info(f"Reading file: {document.filename}")
-        file_binary = await document.read()
 
-        if not file_binary:
-            logger.error("Empty file received")
-            raise HTTPException(status_code=400, detail="File is empty")
+def _document_result(result: DocumentResponse):
+    if (
+        result.status == Status.SUCCESS
+        and result.embeddings_encoded is not None
+        and result._embeddings_binary is not None
+    ):
+        return _multipart_response(result)
+    return result
 
-        # Обрабатываем документ
-        logger.info(f"Starting document processing with method: {split_method}")
-
-        result = await document_pipeline.process_document(
-            file_binary=file_binary,
-            document_id=str(document_id),
-            split_method=split_enum,
-            batch_size=batch_size,
-            llm_model=llm_model,
-            temperature=temperature,
-            prompt_split=prompt_split,
-            prompt_table=prompt_table,
+
+@router.post("/documents/process", response_model=DocumentResponse)
+async def process_document(
+    request: DocumentRequest = Depends(document_form),
+    document: UploadFile = File(..., description="Загружаемый файл"),
+):
+    """
+    Обрабатывает документ и возвращает фрагменты текста с эмбеддингами
+
+    Args:
+        request: Параметры обработки из полей формы
+        document: Загружаемый файл
+
+    Returns:
+        DocumentResponse с фрагментами текста и эмбеддингами
+    """
+    file_path = None
+    try:
+        logger.info(
+            f"Processing document request for document_id: {str(request.document_id)}"
         )
 
+        # Сохраняем файл во временный файл
+        file_path = await _spool_upload(document)
+
+        # Обрабатываем документ
+        logger.info(f"Starting document processing with method: {request.split_method}")
+
+        result = await document_pipeline.process_request(file_path, request)
+
         if result.status == "error":
             logger.error(f"Document processing failed: {result.message}")
             return result
 
         logger.info(
-            f"Document processing completed successfully for document_id: {str(document_id)}"
+            f"Document processing completed successfully for document_id: {str(request.document_id)}"
         )
         logger.info(
             f"Created {result.chunks_count} chunks in {result.processing_time:.2f}s"
         )
 
-        return result
+        return _document_result(result)
 
     except HTTPException:
         raise
@@ -119,3 +234,196 @@ async def process_document(
         raise HTTPException(
             status_code=500, detail=f"Error processing document: {str(e)}"
         )
+    finally:
+        if file_path is not None:
+            await asyncio.to_thread(remove_file, file_path)
+
+
+async def _spool_batch_uploads(
+    documents: List[UploadFile], files: List[Tuple[str, str]]
+):
+    """
+    Сохраняет файлы пакета во временные файлы и дописывает пары (имя, путь)
+    в files; zip-архивы распаковываются на месте архива. Суммарный размер
+    файлов после распаковки ограничен BATCH_MAX_BYTES
+    """
+    max_documents = app_config.BATCH_MAX_DOCUMENTS
+    max_total_bytes = app_config.BATCH_MAX_BYTES
+    too_many = HTTPException(
+        status_code=400, detail=f"Too many documents, maximum is {max_documents}"
+    )
+    total_bytes = 0
+    for document in documents:
+        if len(files) >= max_documents:
+            raise too_many
+        filename = document.filename or ""
+        file_path = await _spool_upload(document)
+        if filename.lower().endswith(".zip"):
+            try:
+                unpacked = await asyncio.to_thread(
+                    unpack_archive,
+                    file_path,
+                    filename,
+                    process_spool_dir(app_config.UPLOAD_TMP_DIR),
+                    app_config.UPLOAD_MAX_BYTES,
+                    max_documents - len(files),
+                    max_total_bytes - total_bytes,
+                )
+                files.extend(unpacked)
+                paths = [path for _, path in unpacked]
+            except zipfile.BadZipFile:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid zip archive: {filename}"
+                )
+            except TooManyFiles:
+                raise too_many
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            finally:
+                await asyncio.to_thread(remove_file, file_path)
+        else:
+            files.append((filename, file_path))
+            paths = [file_path]
+        total_bytes += await asyncio.to_thread(lambda: sum(map(os.path.getsize, paths)))
+        if total_bytes > max_total_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch exceeds maximum size of {max_total_bytes} bytes",
+            )
+
+
+@router.post("/documents/batch", response_model=BatchResponse)
+async def process_document_batch(
+    options: dict = Depends(processing_form),
+    documents: List[UploadFile] = File(
+        ..., description="Загружаемые файлы и zip-архивы с файлами"
+    ),
+    document_ids: Optional[List[UUID]] = Form(
+        default=None,
+        description="Идентификаторы документов в порядке файлов (файлы архивов "
+        "разворачиваются на месте архива); если не заданы, генерируются",
+    ),
+):
+    """
+    Обрабатывает пакет документов одним запросом: файлы извлекаются
+    параллельно, эмбеддинги чанков всех документов считаются общими батчами
+
+    Returns:
+        BatchResponse с результатом по каждому документу
+    """
+    start_time = time.time()
+    if options["embedding_format"] == EmbeddingFormat.BINARY:
+        raise HTTPException(
+            status_code=400, detail="Binary embedding format is not supported for batch"
+        )
+
+    files = []
+    try:
+        await _spool_batch_uploads(documents, files)
+        return await _process_batch(files, options, document_ids, start_time)
+    finally:
+        for _, file_path in files:
+            await asyncio.to_thread(remove_file, file_path)
+
+
+async def _process_batch(
+    files: List[Tuple[str, str]],
+    options: dict,
+    document_ids: Optional[List[UUID]],
+    start_time: float,
+) -> BatchResponse:
+    if not files:
+        raise HTTPException(status_code=400, detail="No documents received")
+    if document_ids and len(document_ids) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Got {len(document_ids)} document_ids for {len(files)} documents",
+        )
+    requests = [
+        DocumentRequest(
+            document_id=document_ids[i] if document_ids else uuid.uuid4(), **options
+        )
+        for i in range(len(files))
+    ]
+    logger.info(f"Processing batch of {len(files)} documents")
+
+    try:
+        results = await document_pipeline.process_batch(
+            [(file_path, request) for (_, file_path), request in zip(files, requests)]
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error processing batch: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Error processing batch: {str(e)}"
+        )
+
+    responses = [
+        BatchDocumentResponse.model_construct(**dict(result), filename=filename)
+        for (filename, _), result in zip(files, results)
+    ]
+    failed_count = sum(result.status != Status.SUCCESS for result in results)
+    processing_time = time.time() - start_time
+    logger.info(
+        f"Batch of {len(files)} documents processed in {processing_time:.2f}s, "
+        f"{failed_count} failed"
+    )
+    return BatchResponse(
+        status=Status.ERROR if failed_count == len(files) else Status.SUCCESS,
+        message=f"Processed {len(files)} documents, {failed_count} failed",
+        documents_count=len(files),
+        failed_count=failed_count,
+        processing_time=processing_time,
+        documents=responses,
+    )
+
+
+@router.post("/documents/jobs", response_model=JobResponse, status_code=202)
+async def submit_document_job(
+    request: DocumentRequest = Depends(document_form),
+    document: UploadFile = File(..., description="Загружаемый файл"),
+):
+    """
+    Ставит обработку документа в очередь и сразу возвращает задание.
+    Прогресс доступен в GET /documents/jobs/{job_id}, результат - в
+    GET /documents/jobs/{job_id}/result
+    """
+    file_path = await _spool_upload(document)
+    try:
+        return await job_manager.submit(file_path, request)
+    finally:
+        # Задание забирает файл к себе, остается он только при ошибке
+        await asyncio.to_thread(remove_file, file_path)
+
+
+@router.get("/documents/jobs/{job_id}", response_model=JobResponse)
+async def get_document_job(job_id: UUID):
+    """Статус и прогресс задания"""
+    job = job_manager.get(str(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/documents/jobs/{job_id}/result", response_model=DocumentResponse)
+async def get_document_job_result(job_id: UUID):
+    """Результат завершенного задания в формате /documents/process"""
+    job = job_manager.get(str(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status not in (JobStatus.COMPLETED, JobStatus.FAILED):
+        raise HTTPException(
+            status_code=409, detail=f"Job is {job.status.value}, result is not ready"
+        )
+    result = await job_manager.get_result(str(job_id))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result not found")
+    return _document_result(result)
+
+
+@router.delete("/documents/jobs/{job_id}", response_model=JobResponse)
+async def cancel_document_job(job_id: UUID):
+    """Отменяет задание в очереди или в работе"""
+    job = await job_manager.cancel(str(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
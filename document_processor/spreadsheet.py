@@ -0,0 +1,139 @@
+from itertools import chain, islice
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from chunker import WORD, iter_chunks
+from progress import advance_progress, set_progress
+
+CELL_SEPARATOR = " | "
+
+
+def _header_labels(row: tuple) -> Optional[List[Optional[str]]]:
+    """
+    Первая непустая строка листа считается заголовком, если все ее непустые
+    ячейки - строки
+    """
+    values = [value for value in row if value is not None and str(value).strip()]
+    if not values or not all(isinstance(value, str) for value in values):
+        return None
+    return [
+        str(value).strip() if value is not None and str(value).strip() else None
+        for value in row
+    ]
+
+
+def format_rows(
+    rows: List[tuple], header: Optional[List[Optional[str]]]
+) -> pd.Series:
+    """
+    Форматирует блок строк по столбцам: "столбец: значение" через " | ",
+    пустые ячейки пропускаются. Для строки без значений возвращается ""
+    """
+    # dtype=object сохраняет типы ячеек: целые не превращаются в float из-за пропусков
+    frame = pd.DataFrame(rows, dtype=object)
+    result = pd.Series("", index=frame.index, dtype=object)
+    filled = np.zeros(len(frame), dtype=bool)
+    for column in frame.columns:
+        values = frame[column]
+        strings = values.astype(str).str.strip()
+        mask = values.notna().to_numpy() & (strings != "").to_numpy()
+        if not mask.any():
+            continue
+        label = header[column] if header and column < len(header) else None
+        if label:
+            strings = label + ": " + strings
+        separator = np.where(filled, CELL_SEPARATOR, "")
+        result = result.where(~mask, result + separator + strings)
+        filled |= mask
+    return result
+
+
+def _split_row(row: str, budget: int) -> Iterator[str]:
+    """
+    Делит строку длиннее budget по границам ячеек; словами режется только
+    ячейка, которая сама не помещается в budget
+    """
+    current = ""
+    for cell in row.split(CELL_SEPARATOR):
+        if current and len(current) + len(CELL_SEPARATOR) + len(cell) <= budget:
+            current += CELL_SEPARATOR + cell
+            continue
+        if current:
+            yield current
+        if len(cell) > budget:
+            yield from iter_chunks(cell, max_chars=budget, boundary=WORD)
+            current = ""
+        else:
+            current = cell
+    if current:
+        yield current
+
+
+def _group_rows(rows: Iterator[str], title: str, max_length: int) -> Iterator[str]:
+    """
+    Собирает строки листа в чанки не длиннее max_length символов,
+    каждый чанк начинается с названия листа
+    """
+    prefix = f"Лист: {title}\n"
+    budget = max(max_length - len(prefix), 1)
+    current: List[str] = []
+    current_length = 0
+    for row in rows:
+        if len(row) > budget:
+            # Строка не помещается в чанк целиком и режется отдельно
+            if current:
+                yield prefix + "\n".join(current)
+                current, current_length = [], 0
+            for part in _split_row(row, budget):
+                yield prefix + part
+            continue
+        if current and current_length + 1 + len(row) > budget:
+            yield prefix + "\n".join(current)
+            current, current_length = [], 0
+        current_length += len(row) + (1 if current else 0)
+        current.append(row)
+    if current:
+        yield prefix + "\n".join(current)
+
+
+def _iter_sheet_rows(worksheet, block_rows: int) -> Iterator[str]:
+    # Размеры листа в файле бывают неверными, поэтому читаем до конца
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows(values_only=True)
+    header = None
+    for row in rows:
+        if any(value is not None and str(value).strip() for value in row):
+            header = _header_labels(row)
+            if header is None:
+                rows = chain([row], rows)
+            break
+
+    while True:
+        block = list(islice(rows, block_rows))
+        if not block:
+            return
+        for text in format_rows(block, header):
+            if text:
+                yield text
+
+
+def iter_xlsx_chunks(
+    file_path: str, max_length: int = 2000, block_rows: int = 5000
+) -> Iterator[str]:
+    """
+    Потоково читает все листы книги в режиме read-only блоками по block_rows
+    строк и возвращает чанки строк не длиннее max_length символов
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        set_progress(pages_total=len(workbook.worksheets))
+        for worksheet in workbook.worksheets:
+            yield from _group_rows(
+                _iter_sheet_rows(worksheet, block_rows), worksheet.title, max_length
+            )
+            advance_progress("pages_done")
+    finally:
+        workbook.close()
@@ -0,0 +1,55 @@
+from chunker import PARAGRAPH, SENTENCE, WORD, iter_chunks
+
+TEXT = (
+    "Первое предложение абзаца. Второе предложение абзаца.\n\n"
+    "Новый абзац начинается здесь. Он тоже из двух предложений."
+)
+
+
+def test_chunks_respect_max_chars():
+    chunks = list(iter_chunks(TEXT * 5, max_chars=40, boundary=WORD))
+    assert chunks
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert " ".join(chunks).split() == (TEXT * 5).split()
+
+
+def test_paragraph_boundary_preferred():
+    chunks = list(iter_chunks(TEXT, max_chars=70, boundary=PARAGRAPH))
+    assert chunks[0] == "Первое предложение абзаца. Второе предложение абзаца."
+    assert chunks[1].startswith("Новый абзац")
+
+
+def test_sentence_boundary():
+    text = "Один два три. Четыре пять шесть семь."
+    chunks = list(iter_chunks(text, max_chars=30, boundary=SENTENCE))
+    assert chunks == ["Один два три.", "Четыре пять шесть семь."]
+
+
+def test_word_boundary_when_boundary_too_early():
+    # Граница предложения заполнила бы чанк меньше чем на MIN_FILL
+    text = "Один. Два три четыре пять."
+    chunks = list(iter_chunks(text, max_chars=20, boundary=SENTENCE))
+    assert chunks == ["Один. Два три четыре", "пять."]
+
+
+def test_overlap_tokens():
+    chunks = list(
+        iter_chunks("a b c d e f g", max_chars=None, max_tokens=3, overlap_tokens=1)
+    )
+    assert chunks == ["a b c", "c d e", "e f g"]
+
+
+def test_long_word_split_by_chars():
+    chunks = list(iter_chunks("abcdefghij xy", max_chars=4))
+    assert chunks == ["abcd", "efgh", "ij", "xy"]
+
+
+def test_empty_and_whitespace_text():
+    assert list(iter_chunks("")) == []
+    assert list(iter_chunks(" \n\t ")) == []
+
+
+def test_lone_surrogate():
+    text = "ab\ud800cd efg"
+    assert list(iter_chunks(text, max_chars=4)) == ["ab\ud800c", "d", "efg"]
+    assert list(iter_chunks(text)) == [text]
@@ -0,0 +1,90 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from document_pipeline import DocumentPipeline, app_config  # noqa: E402
+from result_store import StoredResult  # noqa: E402
+
+
+class FakeResultStore:
+    def __init__(self, previous):
+        self.previous = previous
+
+    def latest(self, document_id):
+        return self.previous
+
+
+def make_pipeline(previous):
+    pipeline = DocumentPipeline.__new__(DocumentPipeline)
+    pipeline.config = app_config
+    pipeline.result_store = FakeResultStore(previous)
+
+    async def get_embeddings(texts):
+        return np.ones((len(texts), 3), dtype="float32")
+
+    pipeline._get_embeddings = get_embeddings
+    return pipeline
+
+
+def stored(texts, embeddings):
+    return StoredResult("fingerprint", app_config.EMBEDDER_MODEL, texts, embeddings)
+
+
+def test_reuse_previous_with_empty_version():
+    pipeline = make_pipeline(stored([], np.empty((0, 0), dtype="float32")))
+    embeddings, missing = asyncio.run(pipeline._reuse_previous("doc", ["a", "b"]))
+    assert embeddings is None
+    assert missing == [0, 1]
+
+
+def test_incremental_embeddings_after_empty_version():
+    pipeline = make_pipeline(stored([], np.empty((0, 0), dtype="float32")))
+    [(embeddings, reused)] = asyncio.run(
+        pipeline._get_embeddings_incremental([("doc", ["a", "b"])])
+    )
+    assert embeddings.shape == (2, 3)
+    assert reused == 0
+
+
+def test_incremental_embeddings_reuse_matching_chunks():
+    previous = np.array([[1, 2, 3], [4, 5, 6]], dtype="float32")
+    pipeline = make_pipeline(stored(["a", "b"], previous))
+    [(embeddings, reused)] = asyncio.run(
+        pipeline._get_embeddings_incremental([("doc", ["b", "c"])])
+    )
+    assert reused == 1
+    np.testing.assert_array_equal(embeddings[0], previous[1])
+    np.testing.assert_array_equal(embeddings[1], np.ones(3))
+
+
+def test_reuse_failure_isolated_to_document():
+    pipeline = make_pipeline(stored(["a"], np.zeros((1, 3), dtype="float32")))
+
+    def latest(document_id):
+        if document_id == "broken":
+            raise OSError("corrupted store")
+        return pipeline.result_store.previous
+
+    pipeline.result_store.latest = latest
+    results = asyncio.run(
+        pipeline._get_embeddings_incremental([("broken", ["a"]), ("doc", ["a", "b"])])
+    )
+    assert [reused for _, reused in results] == [0, 1]
+    assert results[0][0].shape == (1, 3)
+    assert results[1][0].shape == (2, 3)
+
+
+def test_merge_failure_isolated_to_document():
+    # Предыдущая версия закодирована моделью другой размерности
+    pipeline = make_pipeline(stored(["a"], np.zeros((1, 5), dtype="float32")))
+    pipeline.result_store.latest = lambda document_id: (
+        pipeline.result_store.previous if document_id == "old" else None
+    )
+    results = asyncio.run(
+        pipeline._get_embeddings_incremental([("old", ["a", "b"]), ("new", ["c"])])
+    )
+    assert results[0] == (None, 0)
+    assert results[1][0].shape == (1, 3)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from extraction_pool import ExtractionPool
+
+# Функции задач импортируются дочерними процессами по имени модуля,
+# поэтому объявлены на уровне модуля
+
+
+def sleep_and_report(pid_path, seconds):
+    with open(pid_path, "w") as f:
+        f.write(str(os.getpid()))
+    time.sleep(seconds)
+    return seconds
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+def exit_silently():
+    os._exit(1)
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_timeout_kills_only_hung_task(tmp_path):
+    pool = ExtractionPool(processes=2, timeout=1.0)
+    hung_pid_path = str(tmp_path / "hung.pid")
+
+    async def run():
+        return await asyncio.gather(
+            pool.run(sleep_and_report, hung_pid_path, 60),
+            pool.run(sleep_and_report, str(tmp_path / "fast.pid"), 0.1),
+            return_exceptions=True,
+        )
+
+    hung, fast = asyncio.run(run())
+    assert isinstance(hung, TimeoutError)
+    assert fast == 0.1
+    with open(hung_pid_path) as f:
+        assert not process_exists(int(f.read()))
+    assert not pool._running
+
+
+def test_task_exception_is_reraised():
+    pool = ExtractionPool(processes=1, timeout=10)
+    with pytest.raises(ValueError, match="broken"):
+        asyncio.run(pool.run(fail, "broken"))
+
+
+def test_process_exit_without_result():
+    pool = ExtractionPool(processes=1, timeout=10)
+    with pytest.raises(ChildProcessError):
+        asyncio.run(pool.run(exit_silently))
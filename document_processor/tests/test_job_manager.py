@@ -0,0 +1,133 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from config.contracts import (  # noqa: E402
+    DocumentRequest,
+    DocumentResponse,
+    JobStatus,
+    Status,
+)
+from job_manager import INPUT_FILE, JobManager  # noqa: E402
+
+
+class FakePipeline:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def process_request(self, file_path, request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        with open(file_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return DocumentResponse(
+            status=Status.SUCCESS,
+            message="OK",
+            document_id=request.document_id,
+            texts=[text],
+            embeddings=[[1.0]],
+            chunks_count=1,
+            processing_time=0.0,
+        )
+
+
+async def submit(manager, tmp_path, text="text"):
+    file_path = tmp_path / f"{uuid.uuid4().hex}.upload"
+    file_path.write_text(text, encoding="utf-8")
+    return await manager.submit(
+        str(file_path), DocumentRequest(document_id=uuid.uuid4())
+    )
+
+
+async def wait_for_status(manager, job_id, statuses, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        job = manager.get(job_id)
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} stuck in {manager.get(job_id).status}")
+
+
+def test_job_completes_and_keeps_result(tmp_path):
+    async def run():
+        manager = JobManager(FakePipeline(), str(tmp_path / "jobs"), workers=1)
+        await manager.start()
+        job = await submit(manager, tmp_path, "hello")
+        job_id = str(job.job_id)
+        await wait_for_status(manager, job_id, (JobStatus.COMPLETED,))
+        result = await manager.get_result(job_id)
+        await manager.shutdown()
+        return manager, job_id, result
+
+    manager, job_id, result = asyncio.run(run())
+    assert result.texts == ["hello"]
+    assert not os.path.exists(os.path.join(manager._job_dir(job_id), INPUT_FILE))
+
+
+def test_failed_job_saves_error_result(tmp_path):
+    async def run():
+        pipeline = FakePipeline(error=RuntimeError("boom"))
+        manager = JobManager(pipeline, str(tmp_path / "jobs"), workers=1)
+        await manager.start()
+        job = await submit(manager, tmp_path)
+        job = await wait_for_status(manager, str(job.job_id), (JobStatus.FAILED,))
+        result = await manager.get_result(str(job.job_id))
+        await manager.shutdown()
+        return job, result
+
+    job, result = asyncio.run(run())
+    assert job.message == "boom"
+    assert result.status == Status.ERROR
+    assert result.message == "boom"
+
+
+def test_cancel_running_job(tmp_path):
+    async def run():
+        manager = JobManager(FakePipeline(delay=10), str(tmp_path / "jobs"), workers=1)
+        await manager.start()
+        job = await submit(manager, tmp_path)
+        job_id = str(job.job_id)
+        await wait_for_status(manager, job_id, (JobStatus.RUNNING,))
+        await manager.cancel(job_id)
+        await asyncio.sleep(0.05)
+        result = await manager.get_result(job_id)
+        await manager.shutdown()
+        return manager.get(job_id), result
+
+    job, result = asyncio.run(run())
+    assert job.status == JobStatus.CANCELLED
+    assert result is None
+
+
+def test_interrupted_job_requeued_after_restart(tmp_path):
+    root_dir = str(tmp_path / "jobs")
+
+    async def interrupt():
+        manager = JobManager(FakePipeline(delay=10), root_dir, workers=1)
+        await manager.start()
+        job = await submit(manager, tmp_path, "again")
+        await wait_for_status(manager, str(job.job_id), (JobStatus.RUNNING,))
+        await manager.shutdown()
+        return str(job.job_id)
+
+    async def restart(job_id):
+        pipeline = FakePipeline()
+        manager = JobManager(pipeline, root_dir, workers=1)
+        await manager.start()
+        await wait_for_status(manager, job_id, (JobStatus.COMPLETED,))
+        result = await manager.get_result(job_id)
+        await manager.shutdown()
+        return pipeline, result
+
+    job_id = asyncio.run(interrupt())
+    pipeline, result = asyncio.run(restart(job_id))
+    assert pipeline.calls == 1
+    assert result.texts == ["again"]
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+utils = pytest.importorskip("utils")
+
+
+class FakeImage:
+    def close(self):
+        pass
+
+
+class FakePool:
+    async def run(self, func, *args):
+        return b"jpeg"
+
+
+@pytest.fixture
+def fake_pdf(monkeypatch):
+    state = {"active": 0, "max_active": 0, "fail_after": None, "rendered": 0}
+
+    def convert_from_path(file_path, dpi, first_page, last_page):
+        state["rendered"] += last_page - first_page + 1
+        if state["fail_after"] is not None and state["rendered"] > state["fail_after"]:
+            raise RuntimeError("render failed")
+        return [FakeImage() for _ in range(first_page, last_page + 1)]
+
+    async def extract_text_from_image(img_bytes):
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return "text"
+
+    monkeypatch.setattr(utils, "pdfinfo_from_path", lambda path: {})
+    monkeypatch.setattr(utils, "_pdf_render_dpi", lambda info: 72)
+    monkeypatch.setattr(utils, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(utils, "get_extraction_pool", lambda: FakePool())
+    monkeypatch.setattr(utils, "extract_text_from_image", extract_text_from_image)
+    monkeypatch.setattr(utils, "_ocr_semaphore", None)
+    monkeypatch.setattr(utils.app_config, "OCR_CONCURRENCY", 2)
+    monkeypatch.setattr(utils.app_config, "PDF_RENDER_BATCH_PAGES", 3)
+    return state
+
+
+def test_ocr_pages_bounded_by_concurrency(fake_pdf):
+    texts = [""] * 7
+    asyncio.run(utils._ocr_pdf_pages("doc.pdf", list(range(1, 8)), 7, texts))
+    assert texts == ["text"] * 7
+    assert fake_pdf["max_active"] == 2
+
+
+def test_ocr_semaphore_released_after_failure(fake_pdf):
+    fake_pdf["fail_after"] = 3
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await utils._ocr_pdf_pages("doc.pdf", list(range(1, 8)), 7, [""] * 7)
+        await asyncio.sleep(0.05)
+        semaphore = utils.get_ocr_semaphore()
+        # Все разрешения общего семафора вернулись после отмены задач
+        for _ in range(2):
+            await asyncio.wait_for(semaphore.acquire(), timeout=1)
+
+    asyncio.run(run())
@@ -0,0 +1,16 @@
+from spreadsheet import _group_rows, _split_row
+
+
+def test_long_row_split_on_cells():
+    row = "name: c | qty: 3 | extra"
+    assert list(_split_row(row, 18)) == ["name: c | qty: 3", "extra"]
+
+
+def test_long_cell_split_on_words():
+    row = "a | " + "слово " * 4 + "| b"
+    assert list(_split_row(row, 12)) == ["a", "слово слово", "слово слово", "b"]
+
+
+def test_group_rows_keeps_sheet_prefix():
+    chunks = list(_group_rows(iter(["short", "name: c | qty: 3 | extra"]), "S", 25))
+    assert chunks == ["Лист: S\nshort", "Лист: S\nname: c | qty: 3", "Лист: S\nextra"]
@@ -0,0 +1,66 @@
+import os
+import zipfile
+
+import pytest
+
+from uploads import (
+    TooManyFiles,
+    UploadTooLarge,
+    process_spool_dir,
+    remove_spooled_files,
+    unpack_archive,
+)
+
+
+def make_archive(path, members):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_unpack_archive_skips_service_files(tmp_path):
+    archive = make_archive(
+        tmp_path / "kb.zip",
+        {"a.txt": "a", "dir/b.txt": "b", "__MACOSX/a.txt": "x", ".DS_Store": "x"},
+    )
+    files = unpack_archive(archive, "kb.zip", str(tmp_path / "spool"), 100)
+    assert [name for name, _ in files] == ["kb.zip/a.txt", "kb.zip/dir/b.txt"]
+
+
+def test_unpack_archive_member_limit(tmp_path):
+    archive = make_archive(tmp_path / "kb.zip", {"a.txt": "a" * 200})
+    with pytest.raises(UploadTooLarge):
+        unpack_archive(archive, "kb.zip", str(tmp_path / "spool"), 100)
+    assert os.listdir(tmp_path / "spool") == []
+
+
+def test_unpack_archive_stops_at_max_files(tmp_path):
+    archive = make_archive(
+        tmp_path / "kb.zip", {f"{i}.txt": "text" for i in range(10)}
+    )
+    with pytest.raises(TooManyFiles):
+        unpack_archive(archive, "kb.zip", str(tmp_path / "spool"), 100, max_files=3)
+    assert os.listdir(tmp_path / "spool") == []
+
+
+def test_unpack_archive_total_limit(tmp_path):
+    archive = make_archive(
+        tmp_path / "kb.zip", {f"{i}.txt": "0" * 60 for i in range(3)}
+    )
+    with pytest.raises(UploadTooLarge, match="unpacked size"):
+        unpack_archive(
+            archive, "kb.zip", str(tmp_path / "spool"), 100, max_total_bytes=150
+        )
+    assert os.listdir(tmp_path / "spool") == []
+
+
+def test_remove_spooled_files_keeps_live_processes(tmp_path):
+    own = process_spool_dir(str(tmp_path))
+    live = tmp_path / str(os.getppid())
+    dead = tmp_path / "999999999"
+    for directory in (own, live, dead):
+        os.makedirs(directory)
+        open(os.path.join(directory, "a.upload"), "w").close()
+    assert remove_spooled_files(str(tmp_path)) == 2
+    assert sorted(os.listdir(tmp_path)) == [str(os.getppid())]
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import BinaryIO, List, Optional, Tuple
+
+COPY_BLOCK_SIZE = 1024 * 1024
+SPOOL_SUFFIX = ".upload"
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class TooManyFiles(ValueError):
+    pass
+
+
+def _copy_limited(source: BinaryIO, target: BinaryIO, max_bytes: int, name: str):
+    size = 0
+    while True:
+        block = source.read(COPY_BLOCK_SIZE)
+        if not block:
+            return size
+        size += len(block)
+        if size > max_bytes:
+            raise UploadTooLarge(f"{name} exceeds maximum size of {max_bytes} bytes")
+        target.write(block)
+
+
+def spool_file(source: BinaryIO, directory: str, max_bytes: int, name: str) -> str:
+    """
+    Копирует поток блоками во временный файл в directory и возвращает его путь.
+    Если поток больше max_bytes, файл удаляется и выбрасывается UploadTooLarge
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, suffix=SPOOL_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as target:
+            _copy_limited(source, target, max_bytes, name)
+    except BaseException:
+        remove_file(path)
+        raise
+    return path
+
+
+def unpack_archive(
+    archive_path: str,
+    archive_name: str,
+    directory: str,
+    max_bytes: int,
+    max_files: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Распаковывает файлы zip-архива во временные файлы, пропуская служебные
+    файлы и каталоги. Возвращает пары (путь внутри архива, путь к файлу).
+    Размер каждого файла ограничен max_bytes, а всех файлов вместе -
+    max_total_bytes по фактически распакованным байтам. Если файлов больше
+    max_files, распаковка прерывается с TooManyFiles до распаковки лишнего файла
+    """
+    files = []
+    total_bytes = 0
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                basename = os.path.basename(name.rstrip("/"))
+                if (
+                    info.is_dir()
+                    or name.startswith("__MACOSX/")
+                    or basename.startswith(".")
+                ):
+                    continue
+                if max_files is not None and len(files) >= max_files:
+                    raise TooManyFiles(
+                        f"{archive_name} contains more than {max_files} files"
+                    )
+                display_name = f"{archive_name}/{name}"
+                limit = max_bytes
+                if max_total_bytes is not None:
+                    limit = min(limit, max_total_bytes - total_bytes)
+                with archive.open(info) as source:
+                    try:
+                        path = spool_file(source, directory, limit, display_name)
+                    except UploadTooLarge:
+                        if limit < max_bytes:
+                            raise UploadTooLarge(
+                                f"{archive_name} exceeds maximum unpacked size "
+                                f"of {max_total_bytes} bytes"
+                            )
+                        raise
+                files.append((display_name, path))
+                total_bytes += os.path.getsize(path)
+    except BaseException:
+        for _, path in files:
+            remove_file(path)
+        raise
+    return files
+
+
+def process_spool_dir(directory: str) -> str:
+    """
+    Каталог временных файлов текущего процесса внутри directory
+    """
+    return os.path.join(directory, str(os.getpid()))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_spooled_files(directory: str) -> int:
+    """
+    Удаляет временные файлы загрузок, оставшиеся после аварийной остановки:
+    каталог текущего процесса и каталоги завершившихся процессов. Загрузки
+    других работающих воркеров не затрагиваются
+    """
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not (name.isdigit() and os.path.isdir(path)):
+            continue
+        pid = int(name)
+        if pid != os.getpid() and _process_alive(pid):
+            continue
+        removed += sum(1 for entry in os.listdir(path) if entry.endswith(SPOOL_SUFFIX))
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,21 +1,30 @@
+import asyncio
 import magic
 import re
-from docx import Document
-import mammoth
-from io import BytesIO
-import pandas as pd
-from pdf2image import convert_from_bytes
+import unicodedata
+from pdf2image import convert_from_path, pdfinfo_from_path
 import base64
-from PIL import Image
 import openai
 import logging
 from config.app_settings import AppConfig
+from config.constants import OCR_PROMPT
+from ocr_cache import OcrCache, ocr_cache_counter
+from progress import advance_progress, set_progress
+from chunker import iter_chunks
+from spreadsheet import iter_xlsx_chunks
+from extraction_pool import ExtractionPool
+from extractors import doc_text, docx_text, image_to_jpeg, pdf_text_layer
 
 logger = logging.getLogger(__name__)
 app_config = AppConfig()
 
+PDF_PAGE_MAX_HEIGHT = 720
+PDF_DEFAULT_DPI = 200
+# Сколько первых байт файла читается для определения MIME-типа
+MIME_DETECT_BYTES = 64 * 1024
 
-async def process_file(byte_data):
+
+async def process_file(file_path):
     estimator_dict = {
         "pdf": process_pdf,
         "docx": process_docx,
@@ -24,17 +33,22 @@ async def process_file(byte_data):
         "xlsx": process_xlsx,
         "image": process_image,
     }
-    file_type = await detect_file_type(byte_data)
+    file_type = await detect_file_type(file_path)
     if file_type == "unknown":
         logger.warning("Unknown file type detected")
         return "txt", ["unknown"]
     estimator = estimator_dict[file_type]
-    data = await estimator(byte_data)
+    data = await estimator(file_path)
 
     return file_type, data
 
 
-async def detect_file_type(byte_data):
+def _read_head(file_path, size=MIME_DETECT_BYTES):
+    with open(file_path, "rb") as f:
+        return f.read(size)
+
+
+async def detect_file_type(file_path):
     mime = magic.Magic(mime=True)
     mime_types = {
         "application/pdf": "pdf",
@@ -48,146 +62,389 @@ async def detect_file_type(byte_data):
         "image/bmp": "image",
         "image/tiff": "image",
     }
-    detected_type = mime_types.get(mime.from_buffer(byte_data), "unknown")
+    head = await asyncio.to_thread(_read_head, file_path)
+    detected_type = mime_types.get(mime.from_buffer(head), "unknown")
     logger.info(f"Detected file type: {detected_type}")
     return detected_type
 
 
-async def extract_text_from_docx(docx_bytes):
-    doc = Document(BytesIO(docx_bytes))
-    full_text = []
-    for paragraph in doc.paragraphs:
-        full_text.append(paragraph.text)
-    return "\n".join(full_text)
+async def extract_text_from_docx(docx_path):
+    return await get_extraction_pool().run(docx_text, docx_path)
+
 
+async def extract_text_from_doc(doc_path):
+    return await get_extraction_pool().run(doc_text, doc_path)
 
-async def extract_text_from_doc(doc_bytes):
-    result = mammoth.extract_raw_text(BytesIO(doc_bytes))
-    return result.value
+
+async def process_text(text, max_length=3000, max_tokens=None, overlap_tokens=0):
+    """
+    Разбивает текст на чанки не длиннее max_length символов и max_tokens токенов
+    с перекрытием overlap_tokens токенов, по границам из CHUNK_BOUNDARY
+    """
+    chunks = await asyncio.to_thread(
+        lambda: list(
+            iter_chunks(
+                text,
+                max_chars=max_length,
+                max_tokens=max_tokens,
+                overlap_tokens=overlap_tokens,
+                boundary=app_config.CHUNK_BOUNDARY,
+            )
+        )
+    )
+    # Текст без слов, как и раньше, дает один пустой чанк
+    return chunks or [""]
 
 
-async def process_text(text, max_length=3000):
-    parts = []
-    current_part = []
-    current_length = 0
+# Текстовые экстракторы возвращают исходный текст одним сегментом,
+# на чанки его режет пайплайн в зависимости от метода разделения
 
-    for word in re.split(r"(\s+|\W)", text):
-        if current_length + len(word) > max_length:
-            parts.append("".join(current_part))
-            current_part = []
-            current_length = 0
-        current_part.append(word)
-        current_length += len(word)
-    if current_part:
-        parts.append("".join(current_part))
-    return parts
 
+async def process_doc(file_path):
+    text = await extract_text_from_doc(file_path)
+    return [text]
 
-async def process_doc(byte_data):
-    text = await extract_text_from_doc(byte_data)
-    return await process_text(text)
 
+async def process_docx(file_path):
+    text = await extract_text_from_docx(file_path)
+    return [text]
 
-async def process_docx(byte_data):
-    text = await extract_text_from_docx(byte_data)
-    return await process_text(text)
 
+def _read_text(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
 
-async def process_txt(byte_data):
-    text = byte_data.decode("utf-8")
-    return await process_text(text)
 
+async def process_txt(file_path):
+    text = await asyncio.to_thread(_read_text, file_path)
+    return [text]
 
-async def process_xlsx(byte_data, max_length=8000):
-    file_stream = BytesIO(byte_data)
-    df = pd.read_excel(file_stream)
 
-    rows = []
-    for _, row in df.iterrows():
+async def process_xlsx(file_path, max_length=None):
+    max_length = max_length or app_config.XLSX_CHUNK_MAX_LENGTH
+    chunks = await asyncio.to_thread(
+        lambda: list(
+            iter_xlsx_chunks(
+                file_path,
+                max_length=max_length,
+                block_rows=app_config.XLSX_READ_BLOCK_ROWS,
+            )
+        )
+    )
 
-        row_text = " | ".join([str(val) for val in row.values if pd.notna(val)])
-        rows.append(row_text)
+    logger.info(f"Processed Excel file into {len(chunks)} chunks")
+    return chunks
 
-    logger.info(f"Processed Excel file with {len(rows)} rows")
-    return rows
 
+def _pdf_render_dpi(pdf_info):
+    """
+    DPI, при котором страница сразу рендерится высотой PDF_PAGE_MAX_HEIGHT
+    """
+    match = re.match(r"([\d.]+) x ([\d.]+) pts", pdf_info.get("Page size", ""))
+    if not match:
+        return PDF_DEFAULT_DPI
+    height_inches = float(match.group(2)) / 72
+    return max(1, min(PDF_DEFAULT_DPI, int(PDF_PAGE_MAX_HEIGHT / height_inches)))
 
-async def process_pdf(byte_data):
-    # Конвертируем PDF в изображения
-    pdf_imgs = convert_from_bytes(byte_data)
-    texts = []
 
-    for i, img in enumerate(pdf_imgs):
-        logger.info(f"Processing PDF page {i+1}/{len(pdf_imgs)}")
+def _is_usable_text_layer(text):
+    """
+    Текстовый слой пригоден, если в нем достаточно символов и мало мусора
+    (символы замены, управляющие и private use символы от битых шрифтов)
+    """
+    stripped = text.strip() if text else ""
+    if len(stripped) < app_config.PDF_TEXT_MIN_CHARS:
+        return False
+    garbage = sum(
+        1
+        for char in stripped
+        if char == "\ufffd"
+        or unicodedata.category(char) in ("Co", "Cn", "Cs")
+        or (unicodedata.category(char) == "Cc" and char not in "\n\r\t")
+    )
+    return garbage / len(stripped) <= app_config.PDF_TEXT_MAX_GARBAGE_RATIO
+
+
+async def extract_pdf_text_layer(file_path):
+    """
+    Извлекает встроенный текстовый слой постранично.
+    Для страниц без пригодного слоя возвращает None, их нужно распознавать OCR
+    """
+    try:
+        pages = await get_extraction_pool().run(pdf_text_layer, file_path)
+    except Exception as e:
+        logger.warning(f"Failed to read PDF text layer: {e}")
+        return None
+    if pages is None:
+        return None
+    return [text if _is_usable_text_layer(text) else None for text in pages]
 
-        # Масштабируем изображение, если оно слишком большое
-        max_height = 720
-        width, height = img.size
-        if height > max_height:
-            ratio = max_height / float(height)
-            new_width = int(width * ratio)
-            img = img.resize((new_width, max_height), Image.LANCZOS)
 
-        # OCR
-        text = await extract_text_from_image(img)
-        texts.append(text)
+def _page_ranges(pages, max_length):
+    """
+    Группирует номера страниц (с 1) в непрерывные диапазоны не длиннее max_length
+    """
+    ranges = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1 and page - ranges[-1][0] < max_length:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ranges
+
+
+async def process_pdf(file_path):
+    texts = await extract_pdf_text_layer(file_path)
+    if texts is None:
+        pdf_info = await asyncio.to_thread(pdfinfo_from_path, file_path)
+        texts = [None] * int(pdf_info["Pages"])
+    pages_count = len(texts)
+    ocr_pages = [i + 1 for i, text in enumerate(texts) if text is None]
+    logger.info(
+        f"PDF has {pages_count} pages, {pages_count - len(ocr_pages)} with usable "
+        f"text layer, {len(ocr_pages)} sent to OCR"
+    )
+    set_progress(pages_total=pages_count)
+    advance_progress("pages_done", pages_count - len(ocr_pages))
+
+    if ocr_pages:
+        await _ocr_pdf_pages(file_path, ocr_pages, pages_count, texts)
 
     # Объединяем тексты
-    full_text = " ".join(texts)
-
-    return await process_text(full_text)
+    return [" ".join(texts)]
 
 
-async def process_image(byte_data):
-    image = Image.open(BytesIO(byte_data))
-    if image.mode in ("RGBA", "P", "LA"):
-        image = image.convert("RGB")
+async def _ocr_pdf_pages(file_path, ocr_pages, pages_count, texts):
+    """
+    Распознает указанные страницы (с 1) и записывает текст в texts на их места
+    """
+    pdf_info = await asyncio.to_thread(pdfinfo_from_path, file_path)
+    dpi = _pdf_render_dpi(pdf_info)
+    # Общий семафор ограничивает параллельный OCR всех документов процесса
+    semaphore = get_ocr_semaphore()
+
+    async def ocr_page(page, img):
+        async with semaphore:
+            logger.info(f"Processing PDF page {page}/{pages_count}")
+
+            # Масштабирование и JPEG выполняются в пуле процессов
+            try:
+                img_bytes = await get_extraction_pool().run(
+                    image_to_jpeg, img, PDF_PAGE_MAX_HEIGHT
+                )
+            except Exception as e:
+                logger.error(f"Error encoding PDF page {page} for OCR: {e}")
+                img_bytes = None
+            finally:
+                img.close()
+
+            # OCR
+            texts[page - 1] = (
+                await extract_text_from_image(img_bytes) if img_bytes else ""
+            )
+            advance_progress("pages_done")
+
+    # Конвертируем страницы в изображения диапазонами и отдаем каждую страницу
+    # в OCR сразу после рендера. Рендер следующих страниц ждет, пока у документа
+    # не меньше OCR_CONCURRENCY страниц в работе, чтобы не держать их в памяти
+    tasks = []
+    pending = set()
+    try:
+        for first_page, last_page in _page_ranges(
+            ocr_pages, app_config.PDF_RENDER_BATCH_PAGES
+        ):
+            pdf_imgs = await asyncio.to_thread(
+                convert_from_path,
+                file_path,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=last_page,
+            )
+            for offset, img in enumerate(pdf_imgs):
+                if len(pending) >= app_config.OCR_CONCURRENCY:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        task.result()
+                task = asyncio.create_task(ocr_page(first_page + offset, img))
+                tasks.append(task)
+                pending.add(task)
+            del pdf_imgs
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def process_image(file_path):
+    # Декодирование и JPEG выполняются в пуле процессов
+    img_bytes = await get_extraction_pool().run(image_to_jpeg, file_path)
 
     # Извлекаем текст из изображения с помощью OCR
-    text = await extract_text_from_image(image)
+    set_progress(pages_total=1)
+    async with get_ocr_semaphore():
+        text = await extract_text_from_image(img_bytes)
+    advance_progress("pages_done")
+
+    return [text]
+
 
-    return await process_text(text)
+_ocr_client = None
 
 
-async def extract_text_from_image(image):
+def get_ocr_client():
     """
-    Извлекает текст из изображения с помощью OCR
+    Общий асинхронный клиент OpenAI для OCR, переиспользует пул соединений
     """
-    try:
-        # Конвертируем изображение в base64
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-        # Используем OpenAI Vision API для OCR
-        client = openai.OpenAI(
-            api_key=app_config.OPENAI_API_KEY, base_url=str(app_config.OPENAI_BASE_URL)
+    global _ocr_client
+    if _ocr_client is None:
+        _ocr_client = openai.AsyncOpenAI(
+            api_key=app_config.OPENAI_API_KEY,
+            base_url=str(app_config.OPENAI_BASE_URL),
+            timeout=app_config.OCR_TIMEOUT,
+            max_retries=0,
         )
+    return _ocr_client
 
-        response = client.chat.completions.create(
-            model=app_config.OCR_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Ты OCR модель. Извлеки весь текст из этого изображения. Верни только текст без дополнительных комментариев.",
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{img_base64}"
-                            },
-                        },
-                    ],
-                }
-            ],
-            max_tokens=1000,
+
+async def close_ocr_client():
+    global _ocr_client
+    if _ocr_client is not None:
+        await _ocr_client.close()
+        _ocr_client = None
+
+
+_ocr_semaphore = None
+
+
+def get_ocr_semaphore():
+    """
+    Общий для всех документов семафор параллельных запросов OCR
+    """
+    global _ocr_semaphore
+    if _ocr_semaphore is None:
+        _ocr_semaphore = asyncio.Semaphore(app_config.OCR_CONCURRENCY)
+    return _ocr_semaphore
+
+
+_extraction_pool = None
+
+
+def get_extraction_pool():
+    """
+    Общий пул процессов для CPU-тяжелого извлечения
+    """
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ExtractionPool(
+            processes=app_config.EXTRACTION_PROCESSES,
+            timeout=app_config.EXTRACTION_TIMEOUT,
+            memory_limit_bytes=app_config.EXTRACTION_MEMORY_LIMIT_MB * 1024 * 1024,
         )
+    return _extraction_pool
 
-        return response.choices[0].message.content
 
-    except Exception as e:
-        logger.error(f"Error during OCR: {e}")
-        return ""
+def close_extraction_pool():
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown()
+        _extraction_pool = None
+
+
+_ocr_cache = None
+
+
+def get_ocr_cache():
+    """
+    Общий дисковый кэш результатов OCR, None если кэш отключен
+    """
+    global _ocr_cache
+    if _ocr_cache is None and app_config.OCR_CACHE_ENABLED:
+        _ocr_cache = OcrCache(app_config.OCR_CACHE_DIR, app_config.OCR_CACHE_MAX_BYTES)
+    return _ocr_cache
+
+
+async def extract_text_from_image(img_bytes):
+    """
+    Извлекает текст из изображения JPEG с помощью OCR
+    """
+    img_base64 = base64.b64encode(img_bytes).decode()
+
+    cache = get_ocr_cache()
+    counter = ocr_cache_counter.get()
+    cache_key = None
+    if cache is not None:
+        cache_key = OcrCache.make_key(img_bytes, app_config.OCR_MODEL, OCR_PROMPT)
+        try:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+        except Exception as e:
+            logger.error(f"OCR cache lookup failed: {e}")
+            cached = None
+        if cached is not None:
+            if counter is not None:
+                counter.hits += 1
+            return cached
+        if counter is not None:
+            counter.misses += 1
+
+    text = await _request_ocr(img_base64)
+    # Пустой результат может означать ошибку OCR, его не кэшируем
+    if cache_key is not None and text:
+        try:
+            await asyncio.to_thread(cache.set, cache_key, text)
+        except Exception as e:
+            logger.error(f"OCR cache write failed: {e}")
+    return text
+
+
+def _is_retryable_ocr_error(error):
+    """
+    Повторяются таймауты, ошибки соединения, 429 и 5xx. Ошибки авторизации
+    и валидации запроса (остальные 4xx) повтором не исправить
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+async def _request_ocr(img_base64):
+
+    # Используем OpenAI Vision API для OCR
+    client = get_ocr_client()
+    for attempt in range(app_config.OCR_MAX_RETRIES + 1):
+        try:
+            response = await client.chat.completions.create(
+                model=app_config.OCR_MODEL,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": OCR_PROMPT,
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/jpeg;base64,{img_base64}"
+                                },
+                            },
+                        ],
+                    }
+                ],
+                max_tokens=1000,
+            )
+
+            return response.choices[0].message.content
+
+        except Exception as e:
+            if attempt == app_config.OCR_MAX_RETRIES or not _is_retryable_ocr_error(e):
+                logger.error(f"Error during OCR: {e}")
+                return ""
+            delay = app_config.OCR_RETRY_BACKOFF * 2**attempt
+            logger.warning(
+                f"OCR attempt {attempt + 1} failed: {e}, retrying in {delay}s"
+            )
+            await asyncio.sleep(delay)
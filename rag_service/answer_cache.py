@@ -0,0 +1,147 @@
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CachedAnswer(NamedTuple):
+    embedding: np.ndarray
+    answer: str
+    version: Optional[str]
+    created_at: float
+
+
+class AnswerCache:
+    """
+    Семантический кэш готовых ответов.
+
+    Ответы группируются по (document_id, хэш конфигурации промптов и LLM). Внутри группы
+    попаданием считается запрос, эмбеддинг которого близок к сохраненному по косинусу
+    не меньше similarity_threshold. Записи живут не дольше ttl_seconds, при
+    переполнении вытесняются по LRU, а при смене содержимого документа (version)
+    становятся недействительными.
+    """
+
+    def __init__(
+        self, max_entries: int, ttl_seconds: float, similarity_threshold: float
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._groups = {}
+        self._lru = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def config_hash(*parts) -> str:
+        payload = "\x1f".join(str(part) for part in parts)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remove(self, group_key: tuple, entry_id: int):
+        group = self._groups.get(group_key)
+        if group is not None:
+            group.pop(entry_id, None)
+            if not group:
+                del self._groups[group_key]
+        self._lru.pop((group_key, entry_id), None)
+
+    def lookup(
+        self,
+        document_id: str,
+        config_hash: str,
+        embedding: List[float],
+        version: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Возвращает сохраненный ответ на семантически близкий запрос или None
+        """
+        group_key = (str(document_id), config_hash)
+        query = np.asarray(embedding, dtype="float32")
+        now = time.monotonic()
+
+        with self._lock:
+            group = self._groups.get(group_key, {})
+            for entry_id, entry in list(group.items()):
+                if now - entry.created_at > self.ttl_seconds or entry.version != version:
+                    self._remove(group_key, entry_id)
+
+            group = self._groups.get(group_key)
+            if not group:
+                self.misses += 1
+                return None
+
+            entry_ids = list(group.keys())
+            matrix = np.stack([group[entry_id].embedding for entry_id in entry_ids])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._lru.move_to_end((group_key, entry_ids[best]))
+            return group[entry_ids[best]].answer
+
+    def store(
+        self,
+        document_id: str,
+        config_hash: str,
+        embedding: List[float],
+        answer: str,
+        version: Optional[str] = None,
+    ):
+        group_key = (str(document_id), config_hash)
+        entry = CachedAnswer(
+            embedding=np.asarray(embedding, dtype="float32"),
+            answer=answer,
+            version=version,
+            created_at=time.monotonic(),
+        )
+        with self._lock:
+            entry_id = next(self._ids)
+            self._groups.setdefault(group_key, OrderedDict())[entry_id] = entry
+            self._lru[(group_key, entry_id)] = None
+            while len(self._lru) > self.max_entries:
+                (old_group_key, old_entry_id), _ = self._lru.popitem(last=False)
+                self._remove(old_group_key, old_entry_id)
+                self.evictions += 1
+
+    def invalidate(self, document_id: str) -> int:
+        """
+        Удаляет все ответы по документу
+        """
+        with self._lock:
+            group_keys = [key for key in self._groups if key[0] == str(document_id)]
+            removed = 0
+            for group_key in group_keys:
+                for entry_id in list(self._groups[group_key].keys()):
+                    self._remove(group_key, entry_id)
+                    removed += 1
+        if removed:
+            logger.info(
+                "Invalidated %d cached answers for document %s", removed, document_id
+            )
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк recall@k и задержки приближенных индексов относительно точного flat индекса.
+
+Запуск из каталога rag_service:
+    python benchmarks/ann_benchmark.py --chunks 50000 --queries 200
+    python benchmarks/ann_benchmark.py --embeddings corpus.npy
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_search import (  # noqa: E402
+    EmbeddingSearcher,
+    FLAT,
+    HNSW,
+    IVF_FLAT,
+    IVF_PQ,
+)
+
+DIM = 312
+
+
+def make_corpus(chunks: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Синтетический корпус: нормализованные векторы, сгруппированные вокруг центров,
+    как это бывает у эмбеддингов чанков одного документа
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, DIM)).astype("float32")
+    labels = rng.integers(0, clusters, size=chunks)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((chunks, DIM)).astype(
+        "float32"
+    )
+    return normalize(vectors)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(corpus: np.ndarray, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    picked = corpus[rng.integers(0, len(corpus), size=count)]
+    noise = 0.3 * rng.standard_normal(picked.shape).astype("float32")
+    return normalize(picked + noise)
+
+
+def run(searcher: EmbeddingSearcher, queries: np.ndarray, top_k: int, **params):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(searcher.search(query.tolist(), top_k, -1.0, **params))
+    elapsed = time.perf_counter() - start
+    return results, elapsed / len(queries) * 1000
+
+
+def recall(results, baseline) -> float:
+    hits = sum(len(set(r) & set(b)) for r, b in zip(results, baseline))
+    total = sum(len(b) for b in baseline)
+    return hits / total if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50_000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--embeddings", help="Путь к .npy с реальными эмбеддингами (N, 312)"
+    )
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpus = normalize(np.load(args.embeddings).astype("float32"))
+    else:
+        corpus = make_corpus(args.chunks, args.clusters, args.seed)
+    queries = make_queries(corpus, args.queries, args.seed)
+    texts = [str(i) for i in range(len(corpus))]
+
+    print(f"Corpus: {len(corpus)} chunks, {len(queries)} queries, top_k={args.top_k}")
+    print(f"{'index':<10} {'params':<16} {'build, s':>9} {'recall':>8} {'ms/query':>9}")
+
+    baseline = None
+    configs = [
+        (FLAT, [{}]),
+        (HNSW, [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)]),
+        (IVF_FLAT, [{"nprobe": n} for n in (1, 4, 16, 64)]),
+        (IVF_PQ, [{"nprobe": n} for n in (1, 4, 16, 64)]),
+    ]
+    for index_type, param_sets in configs:
+        start = time.perf_counter()
+        searcher = EmbeddingSearcher(corpus, texts, index_type)
+        build_time = time.perf_counter() - start
+        if searcher.index_type != index_type:
+            print(f"{index_type:<10} skipped: corpus too small, fell back to flat")
+            continue
+
+        for params in param_sets:
+            results, latency = run(searcher, queries, args.top_k, **params)
+            if baseline is None:
+                baseline = results
+            label = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(
+                f"{index_type:<10} {label:<16} {build_time:>9.2f} "
+                f"{recall(results, baseline):>8.3f} {latency:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+import base64
+import numpy as np
+from pydantic import BaseModel, Field, conint, model_validator
+from typing import Optional, List, Union
 from enum import Enum
 from uuid import UUID
 from config.rag_settings import AppConfig
@@ -12,6 +14,58 @@ from config.constants import (
 config = AppConfig()
 
 
+class IndexType(str, Enum):
+    AUTO = "auto"
+    FLAT = "flat"
+    HNSW = "hnsw"
+    IVF_FLAT = "ivf_flat"
+    IVF_PQ = "ivf_pq"
+
+
+class EmbeddingDtype(str, Enum):
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
+
+
+class EncodedEmbeddings(BaseModel):
+    data: str = Field(
+        ..., description="Матрица эмбеддингов в base64, little-endian, построчно"
+    )
+    dtype: EmbeddingDtype = Field(
+        default=EmbeddingDtype.FLOAT32, description="Тип элементов: float32 или float16"
+    )
+    shape: List[conint(ge=1)] = Field(
+        ..., min_length=2, max_length=2, description="Размерность [число чанков, dim]"
+    )
+
+    @model_validator(mode="after")
+    def check_size(self):
+        itemsize = np.dtype(self.dtype.value).itemsize
+        expected = self.shape[0] * self.shape[1] * itemsize
+        # Длина base64 без декодирования: 4 символа на 3 байта
+        padding = len(self.data) - len(self.data.rstrip("="))
+        if len(self.data) * 3 // 4 - padding != expected:
+            raise ValueError(
+                f"Embeddings payload does not match shape {self.shape} "
+                f"and dtype {self.dtype.value}"
+            )
+        return self
+
+    def to_array(self) -> np.ndarray:
+        dtype = np.dtype(self.dtype.value).newbyteorder("<")
+        matrix = np.frombuffer(base64.b64decode(self.data), dtype=dtype)
+        return matrix.reshape(self.shape).astype("float32")
+
+
+def decode_embeddings(embeddings):
+    """
+    Приводит эмбеддинги из запроса (списки или EncodedEmbeddings) к матрице float32
+    """
+    if isinstance(embeddings, EncodedEmbeddings):
+        return embeddings.to_array()
+    return embeddings
+
+
 class RAGRequest(BaseModel):
     chat_id: str = Field(..., description="ID чата пользователя")
     user_message: str = Field(..., description="Текст сообщения от пользователя")
@@ -39,6 +93,25 @@ class RAGRequest(BaseModel):
         default=0.0, ge=0.0, le=1.0, description="Порог для фильтрации по similarity"
     )
 
+    index_type: Optional[IndexType] = Field(
+        default=IndexType.AUTO,
+        description="Тип векторного индекса; auto - выбор по числу чанков",
+    )
+    nprobe: Optional[int] = Field(
+        default=None, ge=1, description="Число просматриваемых кластеров для IVF индексов"
+    )
+    ef_search: Optional[int] = Field(
+        default=None, ge=1, description="Ширина поиска по графу для HNSW индекса"
+    )
+    speculative: Optional[bool] = Field(
+        default=config.SPECULATIVE_PIPELINE,
+        description="Запускать фильтр, переформулирование и поиск одновременно",
+    )
+    use_cache: Optional[bool] = Field(
+        default=config.ANSWER_CACHE_ENABLED,
+        description="Возвращать сохраненный ответ на семантически близкий запрос",
+    )
+
     document_id: UUID = Field(
         ..., description="ID документов, к которым привязан чат/пользователь"
     )
@@ -47,13 +120,31 @@ class RAGRequest(BaseModel):
         default="gpt-4o-mini", description="Имя LLM, используемой для генерации"
     )
 
-    embeddings: Optional[List[List[float]]] = Field(
-        ..., description="Список эмбеддингов для поиска похожих документов"
+    embeddings: Optional[Union[List[List[float]], EncodedEmbeddings]] = Field(
+        default=None,
+        description="Список эмбеддингов для поиска похожих документов или та же "
+        "матрица в base64 (EncodedEmbeddings). "
+        "Если не передан, используется индекс документа, сохраненный в сервисе",
     )
 
     text_chunks: Optional[List[str]] = Field(
+        default=None, description="Список отрывков текста, связанных с эмбеддингами"
+    )
+
+
+class IndexRequest(BaseModel):
+    document_id: UUID = Field(..., description="ID документа, для которого строится индекс")
+    embeddings: Union[List[List[float]], EncodedEmbeddings] = Field(
+        ...,
+        description="Нормализованные эмбеддинги чанков документа, списком или в base64",
+    )
+    text_chunks: List[str] = Field(
         ..., description="Список отрывков текста, связанных с эмбеддингами"
     )
+    index_type: Optional[IndexType] = Field(
+        default=IndexType.AUTO,
+        description="Тип векторного индекса; auto - выбор по числу чанков",
+    )
 
 
 class Status(str, Enum):
@@ -61,6 +152,15 @@ class Status(str, Enum):
     ERROR = "error"
 
 
+class IndexResponse(BaseModel):
+    status: Status = Field(..., description="Статус выполнения запроса (success/error)")
+    message: str = Field(..., description="Сообщение о результате операции")
+    document_id: str = Field(..., description="ID документа из запроса")
+    chunks_count: Optional[int] = Field(
+        default=None, description="Количество чанков в индексе"
+    )
+
+
 class RAGResponse(BaseModel):
     status: Status = Field(..., description="Статус выполнения запроса (success/error)")
     message: str = Field(..., description="Сообщение со скриптом результата")
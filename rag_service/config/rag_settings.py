@@ -1,5 +1,5 @@
 from pydantic import Field, AnyUrl
-from typing import Optional
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,6 +11,43 @@ class AppConfig(BaseSettings):
     EMBEDDER_MODEL: Optional[str] = Field(
         default="sergeyzh/rubert-mini-frida", env="EMBEDDER_MODEL"
     )
+    INDEX_STORE_DIR: str = Field(default="data/indexes", env="INDEX_STORE_DIR")
+    SEARCHER_CACHE_MAX_BYTES: int = Field(
+        default=512 * 1024 * 1024, env="SEARCHER_CACHE_MAX_BYTES"
+    )
+    EMBEDDING_MAX_BATCH_SIZE: int = Field(default=32, env="EMBEDDING_MAX_BATCH_SIZE")
+    EMBEDDING_MAX_WAIT_MS: float = Field(default=5.0, env="EMBEDDING_MAX_WAIT_MS")
+    EMBEDDING_WORKERS: int = Field(default=1, env="EMBEDDING_WORKERS")
+    MAP_REDUCE_CONCURRENCY: int = Field(default=4, env="MAP_REDUCE_CONCURRENCY")
+    MAP_REDUCE_BATCH_TIMEOUT: float = Field(
+        default=20.0, env="MAP_REDUCE_BATCH_TIMEOUT"
+    )
+    SPECULATIVE_PIPELINE: bool = Field(default=False, env="SPECULATIVE_PIPELINE")
+    ANSWER_CACHE_ENABLED: bool = Field(default=False, env="ANSWER_CACHE_ENABLED")
+    ANSWER_CACHE_MAX_ENTRIES: int = Field(
+        default=10_000, env="ANSWER_CACHE_MAX_ENTRIES"
+    )
+    ANSWER_CACHE_TTL_SECONDS: float = Field(
+        default=24 * 60 * 60, env="ANSWER_CACHE_TTL_SECONDS"
+    )
+    ANSWER_CACHE_SIMILARITY: float = Field(
+        default=0.95, env="ANSWER_CACHE_SIMILARITY"
+    )
+    STAGE_CACHE_BACKEND: Literal["memory", "sqlite", "none"] = Field(
+        default="memory", env="STAGE_CACHE_BACKEND"
+    )
+    STAGE_CACHE_PATH: str = Field(
+        default="data/stage_cache.sqlite3", env="STAGE_CACHE_PATH"
+    )
+    STAGE_CACHE_MAX_ENTRIES: int = Field(default=50_000, env="STAGE_CACHE_MAX_ENTRIES")
+    STAGE_CACHE_MAX_TEMPERATURE: float = Field(
+        default=0.3, env="STAGE_CACHE_MAX_TEMPERATURE"
+    )
+    LLM_POOL_MAX_SIZE: int = Field(default=32, env="LLM_POOL_MAX_SIZE")
+    LLM_MAX_CONNECTIONS: int = Field(default=100, env="LLM_MAX_CONNECTIONS")
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = Field(
+        default=20, env="LLM_MAX_KEEPALIVE_CONNECTIONS"
+    )
 
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", case_sensitive=False, extra="allow"
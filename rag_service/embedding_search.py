@@ -1,15 +1,74 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
 import faiss
 import numpy as np
-from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+FLAT = "flat"
+HNSW = "hnsw"
+IVF_FLAT = "ivf_flat"
+IVF_PQ = "ivf_pq"
+AUTO = "auto"
+
+# Границы автоматического выбора типа индекса по числу чанков
+FLAT_MAX_CHUNKS = 20_000
+HNSW_MAX_CHUNKS = 200_000
+IVF_FLAT_MAX_CHUNKS = 1_000_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+DEFAULT_EF_SEARCH = 128
+DEFAULT_NPROBE = 16
+# 312 = 52 * 6: по 6 измерений на субквантователь, 8 бит на код
+PQ_M = 52
+PQ_NBITS = 8
+# Минимум обучающих векторов на кластер, рекомендуемый FAISS
+IVF_MIN_POINTS_PER_CENTROID = 39
+
+
+def choose_index_type(chunks_count: int) -> str:
+    """
+    Выбирает тип индекса по размеру документа
+    """
+    if chunks_count <= FLAT_MAX_CHUNKS:
+        return FLAT
+    if chunks_count <= HNSW_MAX_CHUNKS:
+        return HNSW
+    if chunks_count <= IVF_FLAT_MAX_CHUNKS:
+        return IVF_FLAT
+    return IVF_PQ
+
+
+def _detect_index_type(index: faiss.Index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return HNSW
+    if isinstance(index, faiss.IndexIVFPQ):
+        return IVF_PQ
+    if isinstance(index, faiss.IndexIVF):
+        return IVF_FLAT
+    return FLAT
 
 
 class EmbeddingSearcher:
-    def __init__(self, embeddings: List[List[float]], texts: List[str]):
+    def __init__(
+        self,
+        embeddings: List[List[float]],
+        texts: List[str],
+        index_type: str = AUTO,
+    ):
         """
         embeddings: нормализованные эмбеддинги (L2-норма == 1), размерность 312
         texts: соответствующие тексты
+        index_type: flat, hnsw, ivf_flat, ivf_pq или auto (выбор по числу чанков)
         """
-        self.embeddings = np.array(embeddings).astype("float32")
+        self.embeddings = np.asarray(embeddings, dtype="float32")
         self.texts = texts
 
         assert self.embeddings.shape[0] == len(
@@ -19,15 +78,110 @@ class EmbeddingSearcher:
             self.embeddings.shape[1] == 312
         ), "Размерность эмбеддингов должна быть 312"
 
+        if index_type == AUTO:
+            index_type = choose_index_type(len(self.texts))
+        self.index_type = index_type
+        # Отпечаток содержимого, выставляется SearcherCache
+        self.fingerprint = None
         self.index = self._build_index(self.embeddings)
 
+    @classmethod
+    def from_index(cls, index: faiss.Index, texts: List[str]) -> "EmbeddingSearcher":
+        """
+        Создает поисковик поверх уже построенного (например, загруженного с диска) индекса
+        без повторного копирования эмбеддингов.
+        """
+        assert index.ntotal == len(
+            texts
+        ), "Число векторов в индексе и текстов должно совпадать"
+        assert index.d == 312, "Размерность эмбеддингов должна быть 312"
+
+        searcher = cls.__new__(cls)
+        searcher.embeddings = None
+        searcher.texts = texts
+        searcher.index = index
+        searcher.index_type = _detect_index_type(index)
+        searcher.fingerprint = None
+        return searcher
+
+    def memory_bytes(self) -> int:
+        """
+        Приблизительный объем памяти, занимаемый индексом, матрицей и текстами
+        """
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexHNSW):
+            # Векторы плюс ссылки графа на нижнем уровне
+            per_vector = index.d * 4 + HNSW_M * 2 * 4
+        elif isinstance(index, faiss.IndexIVF):
+            # Код вектора плюс его id в инвертированном списке
+            per_vector = index.code_size + 8
+        else:
+            per_vector = index.d * 4
+        vectors = index.ntotal * per_vector
+        matrix = self.embeddings.nbytes if self.embeddings is not None else 0
+        texts = sum(len(text) for text in self.texts) * 2
+        return vectors + matrix + texts
+
     def _build_index(self, embeddings: np.ndarray):
-        index = faiss.IndexFlatIP(embeddings.shape[1])
+        dim = embeddings.shape[1]
+        count = embeddings.shape[0]
+
+        if self.index_type in (IVF_FLAT, IVF_PQ):
+            nlist = min(
+                int(4 * np.sqrt(count)), count // IVF_MIN_POINTS_PER_CENTROID
+            )
+            if self.index_type == IVF_PQ and count < (1 << PQ_NBITS) * 4:
+                # Для обучения PQ-кодбуков векторов слишком мало
+                nlist = 0
+            if nlist < 1:
+                logger.info(
+                    "Too few chunks (%d) for %s index, using flat", count, self.index_type
+                )
+                self.index_type = FLAT
+
+        if self.index_type == HNSW:
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        elif self.index_type == IVF_FLAT:
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFFlat(
+                quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+        elif self.index_type == IVF_PQ:
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+        elif self.index_type == FLAT:
+            index = faiss.IndexFlatIP(dim)
+        else:
+            raise ValueError(f"Unknown index type: {self.index_type}")
+
         index.add(embeddings)
         return index
 
+    def _search_params(
+        self, top_k: int, nprobe: Optional[int], ef_search: Optional[int]
+    ) -> Optional[faiss.SearchParameters]:
+        # Параметры передаются в search, а не выставляются на индексе,
+        # потому что один индекс из кэша используют параллельные запросы
+        if self.index_type == HNSW:
+            return faiss.SearchParametersHNSW(
+                efSearch=max(ef_search or DEFAULT_EF_SEARCH, top_k)
+            )
+        if self.index_type in (IVF_FLAT, IVF_PQ):
+            return faiss.SearchParametersIVF(nprobe=nprobe or DEFAULT_NPROBE)
+        return None
+
     def search(
-        self, query_embedding: List[float], top_k: int, threshold: float
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        threshold: float,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
     ) -> List[str]:
         """
         Выполняет поиск по cosine similarity (dot product).
@@ -35,10 +189,16 @@ class EmbeddingSearcher:
         query_embedding: нормализованный эмбеддинг запроса
         top_k: сколько вернуть ближайших соседей
         threshold: минимальное значение cosine similarity
+        nprobe: число просматриваемых кластеров для IVF индексов
+        ef_search: ширина поиска по графу для HNSW индекса
         """
         query = np.array([query_embedding], dtype="float32")  # (1, 312)
 
-        similarities, indices = self.index.search(query, top_k)
+        params = self._search_params(top_k, nprobe, ef_search)
+        if params is None:
+            similarities, indices = self.index.search(query, top_k)
+        else:
+            similarities, indices = self.index.search(query, top_k, params=params)
 
         results = []
         for idx, sim in zip(indices[0], similarities[0]):
@@ -46,3 +206,114 @@ class EmbeddingSearcher:
                 results.append(self.texts[idx])
 
         return results
+
+
+class SearcherCache:
+    """
+    LRU-кэш построенных EmbeddingSearcher с ограничением по суммарному объему памяти.
+
+    Ключ - document_id, тип индекса и отпечаток содержимого (число чанков и хэш
+    байтов эмбеддингов), поэтому измененный документ не получит устаревший индекс.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(embeddings: np.ndarray) -> str:
+        return hashlib.blake2b(
+            np.ascontiguousarray(embeddings).tobytes(), digest_size=16
+        ).hexdigest()
+
+    def get(self, key: tuple) -> Optional[EmbeddingSearcher]:
+        """
+        Возвращает поисковик по ключу, первым элементом которого идет document_id
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, searcher: EmbeddingSearcher) -> EmbeddingSearcher:
+        """
+        Кладет поисковик в кэш, вытесняя давно не использованные. Поисковик
+        больше всего лимита не кэшируется
+        """
+        size = searcher.memory_bytes()
+        if size > self.max_bytes:
+            logger.info(
+                "Searcher for document %s (%d bytes) exceeds cache limit, not cached",
+                key[0],
+                size,
+            )
+            return searcher
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (searcher, size)
+                self._total_bytes += size
+                self._evict()
+        return searcher
+
+    def get_or_build(
+        self,
+        document_id: str,
+        embeddings: List[List[float]],
+        texts: List[str],
+        index_type: str = AUTO,
+    ) -> EmbeddingSearcher:
+        """
+        Возвращает поисковик из кэша или строит новый и кладет его в кэш
+        """
+        matrix = np.asarray(embeddings, dtype="float32")
+        if index_type == AUTO:
+            index_type = choose_index_type(len(texts))
+        fingerprint = self.fingerprint(matrix)
+        key = (str(document_id), index_type, len(texts), fingerprint)
+
+        searcher = self.get(key)
+        if searcher is not None:
+            return searcher
+
+        searcher = EmbeddingSearcher(matrix, texts, index_type)
+        searcher.fingerprint = fingerprint
+        return self.put(key, searcher)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            (document_id, *_), (_, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            logger.debug("Evicted searcher for document %s (%d bytes)", document_id, size)
+
+    def invalidate(self, document_id: str) -> int:
+        """
+        Удаляет из кэша все версии поисковика для документа
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == str(document_id)]
+            for key in keys:
+                _, size = self._entries.pop(key)
+                self._total_bytes -= size
+            return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
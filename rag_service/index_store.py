@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import List, Optional
+
+import faiss
+from embedding_search import AUTO, EmbeddingSearcher, SearcherCache
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.json"
+CURRENT_FILE = "CURRENT"
+STORED = "stored"
+
+
+class IndexStore:
+    """
+    Персистентное хранилище векторных индексов, ключ - document_id.
+
+    Каждая версия индекса документа лежит в своем каталоге вместе с текстами
+    чанков, а файл CURRENT с именем актуальной версии пишется последним и
+    подменяется атомарно, поэтому индекс и чанки разных версий не смешиваются.
+    Загруженные поисковики держатся в общем SearcherCache с ограничением по
+    памяти, поэтому стоимость запроса зависит от top_k, а не от размера документа.
+    Имя версии служит отпечатком поисковика для кэша ответов.
+    """
+
+    def __init__(self, root_dir: str, cache: SearcherCache):
+        self.root_dir = root_dir
+        self.cache = cache
+        self._lock = threading.RLock()
+        os.makedirs(self.root_dir, exist_ok=True)
+        logger.info("Initialized index store in %s", self.root_dir)
+
+    def _document_dir(self, document_id: str) -> str:
+        return os.path.join(self.root_dir, str(document_id))
+
+    def _current_version(self, document_dir: str) -> Optional[str]:
+        try:
+            with open(os.path.join(document_dir, CURRENT_FILE), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def upsert(
+        self,
+        document_id: str,
+        embeddings: List[List[float]],
+        texts: List[str],
+        index_type: str = AUTO,
+    ) -> EmbeddingSearcher:
+        """
+        Строит индекс документа и сохраняет его на диск, заменяя предыдущую версию
+        """
+        key = str(document_id)
+        searcher = EmbeddingSearcher(embeddings, texts, index_type)
+        version = uuid.uuid4().hex
+        searcher.fingerprint = version
+        document_dir = self._document_dir(key)
+        version_dir = os.path.join(document_dir, version)
+
+        with self._lock:
+            previous = self._current_version(document_dir)
+            os.makedirs(version_dir)
+            faiss.write_index(searcher.index, os.path.join(version_dir, INDEX_FILE))
+            with open(
+                os.path.join(version_dir, CHUNKS_FILE), "w", encoding="utf-8"
+            ) as f:
+                json.dump(texts, f, ensure_ascii=False)
+            # Версия становится актуальной одной атомарной заменой CURRENT
+            current_tmp = os.path.join(document_dir, CURRENT_FILE + ".tmp")
+            with open(current_tmp, "w") as f:
+                f.write(version)
+            os.replace(current_tmp, os.path.join(document_dir, CURRENT_FILE))
+            if previous is not None:
+                shutil.rmtree(os.path.join(document_dir, previous), ignore_errors=True)
+
+            self.cache.invalidate(key)
+            self.cache.put((key, STORED, version), searcher)
+
+        logger.info(
+            "Stored %s index for document %s (%d chunks)",
+            searcher.index_type,
+            document_id,
+            len(texts),
+        )
+        return searcher
+
+    def get(self, document_id: str) -> Optional[EmbeddingSearcher]:
+        """
+        Возвращает поисковик документа из кэша или загружает его с диска
+        """
+        key = str(document_id)
+        document_dir = self._document_dir(key)
+        # Вторая попытка нужна, если версия сменилась во время загрузки
+        for _ in range(2):
+            version = self._current_version(document_dir)
+            if version is None:
+                return None
+            searcher = self.cache.get((key, STORED, version))
+            if searcher is not None:
+                return searcher
+
+            version_dir = os.path.join(document_dir, version)
+            try:
+                index = faiss.read_index(os.path.join(version_dir, INDEX_FILE))
+                with open(
+                    os.path.join(version_dir, CHUNKS_FILE), "r", encoding="utf-8"
+                ) as f:
+                    texts = json.load(f)
+                searcher = EmbeddingSearcher.from_index(index, texts)
+            except Exception as e:
+                if self._current_version(document_dir) != version:
+                    continue
+                logger.error("Failed to load index for document %s: %s", key, e)
+                return None
+
+            searcher.fingerprint = version
+            logger.info("Loaded index for document %s from disk", key)
+            return self.cache.put((key, STORED, version), searcher)
+        return None
+
+    def delete(self, document_id: str) -> bool:
+        """
+        Удаляет индекс документа из кэша и с диска
+        """
+        key = str(document_id)
+        with self._lock:
+            removed = self.cache.invalidate(key) > 0
+            document_dir = self._document_dir(key)
+            if os.path.isdir(document_dir):
+                shutil.rmtree(document_dir)
+                removed = True
+
+        if removed:
+            logger.info("Deleted index for document %s", key)
+        return removed
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List
+
+import httpx
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPool:
+    """
+    Пул LLM-клиентов и цепочек, переиспользуемых между запросами.
+
+    Клиенты ключуются по (model, temperature, base_url), цепочки - дополнительно по хэшу
+    промпта. Все клиенты работают через один httpx.AsyncClient с keep-alive, поэтому
+    соединения и TLS-сессии не создаются заново на каждый запрос.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        max_size: int = 32,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_size = max_size
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            )
+        )
+        self._llms = OrderedDict()
+        self._chains = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _prompt_hash(template: str) -> str:
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+    def _get_or_create(self, cache: OrderedDict, key, factory):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+                return value
+            value = factory()
+            cache[key] = value
+            while len(cache) > self.max_size:
+                cache.popitem(last=False)
+            return value
+
+    def get_llm(self, model: str, temperature: float) -> ChatOpenAI:
+        key = (model, temperature, self.base_url)
+
+        def create():
+            logger.info("Creating LLM client for %s (temperature=%s)", model, temperature)
+            return ChatOpenAI(
+                openai_api_key=self.api_key,
+                model_name=model,
+                temperature=temperature,
+                base_url=self.base_url,
+                http_async_client=self.http_client,
+            )
+
+        return self._get_or_create(self._llms, key, create)
+
+    def get_chain(
+        self,
+        model: str,
+        temperature: float,
+        template: str,
+        input_variables: List[str],
+    ) -> LLMChain:
+        key = (model, temperature, self.base_url, self._prompt_hash(template))
+
+        def create():
+            prompt = PromptTemplate(input_variables=input_variables, template=template)
+            return LLMChain(llm=self.get_llm(model, temperature), prompt=prompt)
+
+        return self._get_or_create(self._chains, key, create)
+
+    async def aclose(self):
+        await self.http_client.aclose()
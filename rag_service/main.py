@@ -2,7 +2,7 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from router import router
+from router import router, rag_pipeline
 from config.logger import setup_logging
 
 setup_logging()
@@ -39,6 +39,8 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("RAG Service shutting down...")
+    await rag_pipeline.embedding_worker.shutdown()
+    await rag_pipeline.llm_pool.aclose()
 
 
 if __name__ == "__main__":
@@ -1,65 +1,232 @@
+import asyncio
 import logging
 import json
-from typing import Optional, List, Self
+from typing import Any, AsyncIterator, Dict, Optional, List, NamedTuple, Tuple
 from sentence_transformers import SentenceTransformer
-from langchain.prompts import PromptTemplate
-from langchain.chat_models import ChatOpenAI
 from langchain.chains import LLMChain
-from config.contracts import RAGResponse, Status
+from config.contracts import RAGResponse, Status, IndexType
 from config.rag_settings import AppConfig
 from config.constants import FILTER_BAD_REQUEST_PROMPT, IS_BAD_ANSWER, IS_NO_ANSWER
-from embedding_search import EmbeddingSearcher
+from answer_cache import AnswerCache
+from embedding_search import EmbeddingSearcher, SearcherCache
+from embedding_worker import EmbeddingWorker
+from index_store import IndexStore
+from llm_pool import LLMPool
+from stage_cache import create_stage_cache
 
 logger = logging.getLogger(__name__)
 app_config = AppConfig()
 
 
+class RAGChains(NamedTuple):
+    filter: LLMChain
+    retrieve: LLMChain
+    map_reduce: LLMChain
+    generate: LLMChain
+
+
+def _parse_filter(output: str) -> bool:
+    result = json.loads(output)
+    if not isinstance(result, dict):
+        raise ValueError(f"Filter output is not a JSON object: {output}")
+    return result.get("result") == "yes"
+
+
+def _parse_picks(output: str) -> List[str]:
+    picks = json.loads(output)
+    if not isinstance(picks, list):
+        raise ValueError(f"Map-reduce output is not a JSON list: {output}")
+    return picks
+
+
 class RAGPipeline:
     def __init__(self, config: AppConfig = app_config):
         self.config = config
         logger.info("Initialized RAG Pipeline class")
         self.embedder = SentenceTransformer(self.config.EMBEDDER_MODEL)
+        self.embedding_worker = EmbeddingWorker(
+            self.embedder,
+            max_batch_size=self.config.EMBEDDING_MAX_BATCH_SIZE,
+            max_wait_ms=self.config.EMBEDDING_MAX_WAIT_MS,
+            workers=self.config.EMBEDDING_WORKERS,
+        )
+        self.searcher_cache = SearcherCache(self.config.SEARCHER_CACHE_MAX_BYTES)
+        self.index_store = IndexStore(self.config.INDEX_STORE_DIR, self.searcher_cache)
+        self.answer_cache = AnswerCache(
+            max_entries=self.config.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=self.config.ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=self.config.ANSWER_CACHE_SIMILARITY,
+        )
+        self.stage_cache = create_stage_cache(
+            self.config.STAGE_CACHE_BACKEND,
+            max_temperature=self.config.STAGE_CACHE_MAX_TEMPERATURE,
+            max_entries=self.config.STAGE_CACHE_MAX_ENTRIES,
+            path=self.config.STAGE_CACHE_PATH,
+        )
+        self.llm_pool = LLMPool(
+            api_key=self.config.OPENAI_API_KEY,
+            base_url=str(self.config.OPENAI_BASE_URL),
+            max_size=self.config.LLM_POOL_MAX_SIZE,
+            max_connections=self.config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=self.config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
 
-    async def _init_llm(
+    def _get_chains(
         self,
         llm_model: str,
         temperature: float,
         prompt_retrieve: str,
         prompt_augmentation: str,
         prompt_generation: str,
-    ) -> Self:
-        logger.info("Initializing LangChain model and prompts")
-        self.llm = ChatOpenAI(
-            openai_api_key=self.config.OPENAI_API_KEY,
-            model_name=llm_model,
-            temperature=temperature,
-            base_url=str(self.config.OPENAI_BASE_URL),
+    ) -> RAGChains:
+        return RAGChains(
+            filter=self.llm_pool.get_chain(
+                llm_model, temperature, FILTER_BAD_REQUEST_PROMPT, ["request"]
+            ),
+            retrieve=self.llm_pool.get_chain(
+                llm_model, temperature, prompt_retrieve, ["request"]
+            ),
+            map_reduce=self.llm_pool.get_chain(
+                llm_model, temperature, prompt_augmentation, ["request", "info"]
+            ),
+            generate=self.llm_pool.get_chain(
+                llm_model, temperature, prompt_generation, ["request", "info"]
+            ),
         )
 
-        self.filter_prompt = PromptTemplate(
-            input_variables=["request"],
-            template=FILTER_BAD_REQUEST_PROMPT,
+    async def _map_batch(
+        self,
+        chain: LLMChain,
+        semaphore: asyncio.Semaphore,
+        user_message: str,
+        batch: List[str],
+    ) -> List[str]:
+        info = "\n".join(batch)
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    self.stage_cache.apredict(
+                        chain, _parse_picks, request=user_message, info=info
+                    ),
+                    timeout=self.config.MAP_REDUCE_BATCH_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Map-reduce batch timed out after %.1fs, dropping it",
+                    self.config.MAP_REDUCE_BATCH_TIMEOUT,
+                )
+            except ValueError as e:
+                logger.error("Map-reduce output is not valid JSON list: %s", e)
+        return []
+
+    async def _select_segments(
+        self,
+        chain: LLMChain,
+        user_message: str,
+        raw_segments: List[str],
+        batch_size: int = 3,
+    ) -> List[str]:
+        """
+        Параллельно отбирает релевантные отрывки батчами и объединяет результаты
+        в порядке ранжирования retriever
+        """
+        semaphore = asyncio.Semaphore(self.config.MAP_REDUCE_CONCURRENCY)
+        batches = [
+            raw_segments[i : i + batch_size]
+            for i in range(0, len(raw_segments), batch_size)
+        ]
+        results = await asyncio.gather(
+            *(
+                self._map_batch(chain, semaphore, user_message, batch)
+                for batch in batches
+            )
         )
-        self.retrieve_prompt = PromptTemplate(
-            input_variables=["request"],
-            template=prompt_retrieve,
+        return [segment for picks in results for segment in picks]
+
+    async def _passes_filter(self, chain: LLMChain, user_message: str) -> bool:
+        return await self.stage_cache.apredict(
+            chain, _parse_filter, request=user_message
         )
-        self.map_reduce_prompt = PromptTemplate(
-            input_variables=["request", "info"],
-            template=prompt_augmentation,
+
+    async def _retrieve(
+        self,
+        searcher: EmbeddingSearcher,
+        query: str,
+        top_k: int,
+        threshold: float,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        query_emb: Optional[List[float]] = None,
+    ) -> List[str]:
+        if query_emb is None:
+            query_emb = await self.embedding_worker.encode(query)
+        return searcher.search(
+            query_emb, top_k, threshold, nprobe=nprobe, ef_search=ef_search
         )
-        self.generation_prompt = PromptTemplate(
-            input_variables=["request", "info"],
-            template=prompt_generation,
+
+    def _start_speculative(
+        self,
+        chains: RAGChains,
+        searcher: EmbeddingSearcher,
+        user_message: str,
+        top_k: int,
+        threshold: float,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        message_emb: Optional[List[float]] = None,
+    ) -> Tuple[asyncio.Task, asyncio.Task]:
+        """
+        Запускает переформулирование запроса и поиск по исходному сообщению,
+        не дожидаясь фильтра
+        """
+        rewrite_task = asyncio.create_task(
+            self.stage_cache.apredict(chains.retrieve, request=user_message)
         )
+        raw_task = asyncio.create_task(
+            self._retrieve(
+                searcher,
+                user_message,
+                top_k,
+                threshold,
+                nprobe,
+                ef_search,
+                message_emb,
+            )
+        )
+        return rewrite_task, raw_task
 
-        self.filter_chain = LLMChain(llm=self.llm, prompt=self.filter_prompt)
-        self.retrieve_chain = LLMChain(llm=self.llm, prompt=self.retrieve_prompt)
-        self.map_reduce_chain = LLMChain(llm=self.llm, prompt=self.map_reduce_prompt)
-        self.generate_chain = LLMChain(llm=self.llm, prompt=self.generation_prompt)
-        return self
+    async def _finish_speculative(
+        self,
+        tasks: Tuple[asyncio.Task, asyncio.Task],
+        searcher: EmbeddingSearcher,
+        top_k: int,
+        threshold: float,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+    ) -> Tuple[str, List[str]]:
+        """
+        Дожидается задач _start_speculative и ищет по улучшенному запросу.
+        Отрывки по исходному сообщению дополняют выдачу в пределах top_k
+        """
+        rewrite_task, raw_task = tasks
+        improved_query = await rewrite_task
+        segments = await self._retrieve(
+            searcher, improved_query, top_k, threshold, nprobe, ef_search
+        )
+        message_segments = await raw_task
+
+        seen = set(segments)
+        segments.extend(s for s in message_segments if s not in seen)
+        return improved_query, segments[:top_k]
 
-    async def process_rag_request(
+    @staticmethod
+    async def _cancel_tasks(tasks: Tuple[asyncio.Task, ...]):
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stream_rag_request(
         self,
         chat_id: str,
         user_message: str,
@@ -72,12 +239,83 @@ class RAGPipeline:
         top_k: int,
         temperature: float,
         threshold: float,
-        embeddings: List[List[float]],
-        text_chunks: List[str],
-    ) -> RAGResponse:
+        embeddings: Optional[List[List[float]]],
+        text_chunks: Optional[List[str]],
+        index_type: Optional[IndexType] = IndexType.AUTO,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        speculative: bool = False,
+        use_cache: bool = False,
+        stream_tokens: bool = True,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Выполняет RAG запрос, отдавая события по мере завершения этапов:
+        filtered, retrieved, selected, token (части ответа LLM) и итоговый result
+        с RAGResponse
+        """
         try:
+            if embeddings is not None and text_chunks is not None:
+                searcher = await asyncio.to_thread(
+                    self.searcher_cache.get_or_build,
+                    document_id,
+                    embeddings,
+                    text_chunks,
+                    IndexType(index_type or IndexType.AUTO).value,
+                )
+            else:
+                searcher = await asyncio.to_thread(self.index_store.get, document_id)
+            if searcher is None:
+                logger.warning("No stored index for document %s", document_id)
+                yield {
+                    "event": "result",
+                    "response": RAGResponse(
+                        status=Status.ERROR,
+                        message="INDEX_NOT_FOUND",
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        document_id=document_id,
+                    ),
+                }
+                return
 
-            await self._init_llm(
+            message_emb = None
+            if use_cache:
+                config_hash = AnswerCache.config_hash(
+                    llm_model,
+                    temperature,
+                    prompt_retrieve,
+                    prompt_augmentation,
+                    prompt_generation,
+                    top_k,
+                    threshold,
+                    IndexType(index_type or IndexType.AUTO).value,
+                    nprobe,
+                    ef_search,
+                    speculative,
+                )
+                message_emb = await self.embedding_worker.encode(user_message)
+                cached = self.answer_cache.lookup(
+                    document_id, config_hash, message_emb, searcher.fingerprint
+                )
+                # В кэш попадают только ответы на запросы, прошедшие фильтр,
+                # поэтому попадание отдается без обращений к LLM
+                if cached is not None:
+                    logger.info("Answer cache hit for document %s", document_id)
+                    yield {"event": "cached"}
+                    yield {
+                        "event": "result",
+                        "response": RAGResponse(
+                            status=Status.SUCCESS,
+                            message="OK",
+                            chat_id=chat_id,
+                            message_id=message_id,
+                            document_id=document_id,
+                            generated_answer=cached,
+                        ),
+                    }
+                    return
+
+            chains = self._get_chains(
                 llm_model,
                 temperature,
                 prompt_retrieve,
@@ -85,89 +323,150 @@ class RAGPipeline:
                 prompt_generation,
             )
 
-            logger.debug("Filtering user request")
-            filter_output = await self.filter_chain.apredict(request=user_message)
-            filter_json = json.loads(filter_output)
-            if filter_json.get("result") != "yes":
-                logger.warning("Request did not pass filter: %s", user_message)
-                return RAGResponse(
-                    status=Status.ERROR,
-                    message="IS_BAD_ANSWER",
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    document_id=document_id,
-                    generated_answer=IS_BAD_ANSWER,
+            # В спекулятивном режиме переформулирование и поиск идут параллельно
+            # с фильтром и отменяются, если фильтр не пройден
+            speculative_tasks: Tuple[asyncio.Task, ...] = ()
+            if speculative:
+                logger.debug("Transforming and searching speculatively")
+                speculative_tasks = self._start_speculative(
+                    chains,
+                    searcher,
+                    user_message,
+                    top_k,
+                    threshold,
+                    nprobe,
+                    ef_search,
+                    message_emb,
                 )
+            try:
+                logger.debug("Filtering user request")
+                passed = await self._passes_filter(chains.filter, user_message)
+                yield {"event": "filtered", "passed": passed}
+                if not passed:
+                    logger.warning("Request did not pass filter: %s", user_message)
+                    yield {
+                        "event": "result",
+                        "response": RAGResponse(
+                            status=Status.ERROR,
+                            message="IS_BAD_ANSWER",
+                            chat_id=chat_id,
+                            message_id=message_id,
+                            document_id=document_id,
+                            generated_answer=IS_BAD_ANSWER,
+                        ),
+                    }
+                    return
+
+                if speculative:
+                    improved_query, raw_segments = await self._finish_speculative(
+                        speculative_tasks, searcher, top_k, threshold, nprobe, ef_search
+                    )
+                else:
+                    logger.debug("Transforming user query")
+                    improved_query = await self.stage_cache.apredict(
+                        chains.retrieve, request=user_message
+                    )
 
-            logger.debug("Transforming user query")
-            improved_query = await self.retrieve_chain.apredict(request=user_message)
+                    logger.debug("Embedding and searching for relevant chunks")
+                    raw_segments = await self._retrieve(
+                        searcher, improved_query, top_k, threshold, nprobe, ef_search
+                    )
+            finally:
+                await self._cancel_tasks(speculative_tasks)
 
-            logger.debug("Embedding and searching for relevant chunks")
-            query_emb = self.embedder.encode(
-                improved_query, normalize_embeddings=True
-            ).tolist()
-            searcher = EmbeddingSearcher(embeddings, text_chunks)
-            raw_segments = searcher.search(query_emb, top_k, threshold)
+            yield {"event": "retrieved", "chunks": len(raw_segments)}
             if not raw_segments:
                 logger.info("No relevant segments found for query: %s", improved_query)
-                return RAGResponse(
-                    status=Status.ERROR,
-                    message="IS_NO_ANSWER",
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    document_id=document_id,
-                    generated_answer=IS_NO_ANSWER,
-                )
+                yield {
+                    "event": "result",
+                    "response": RAGResponse(
+                        status=Status.ERROR,
+                        message="IS_NO_ANSWER",
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        document_id=document_id,
+                        generated_answer=IS_NO_ANSWER,
+                    ),
+                }
+                return
 
             logger.debug("Applying map-reduce to select best segments")
-            selected_segments: List[str] = []
-            batch_size = 3
-            for i in range(0, len(raw_segments), batch_size):
-                batch = raw_segments[i : i + batch_size]
-                info = "\n".join(batch)
-                map_out = await self.map_reduce_chain.apredict(
-                    request=user_message, info=info
-                )
-                try:
-                    picks = json.loads(map_out)
-                    if isinstance(picks, list):
-                        selected_segments.extend(picks)
-                except json.JSONDecodeError:
-                    logger.error(
-                        "Map-reduce output is not valid JSON list: %s", map_out
-                    )
+            selected_segments = await self._select_segments(
+                chains.map_reduce, user_message, raw_segments
+            )
+            yield {"event": "selected", "segments": len(selected_segments)}
             if not selected_segments:
                 logger.info("Map-reduce did not yield any segments")
-                return RAGResponse(
-                    status=Status.ERROR,
-                    message="IS_NO_ANSWER",
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    document_id=document_id,
-                    generated_answer=IS_NO_ANSWER,
-                )
+                yield {
+                    "event": "result",
+                    "response": RAGResponse(
+                        status=Status.ERROR,
+                        message="IS_NO_ANSWER",
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        document_id=document_id,
+                        generated_answer=IS_NO_ANSWER,
+                    ),
+                }
+                return
 
             logger.debug("Generating final answer")
             info_for_gen = "\n".join(selected_segments)
-            generated = await self.generate_chain.apredict(
-                request=user_message, info=info_for_gen
-            )
+            if stream_tokens:
+                prompt = chains.generate.prompt.format(
+                    request=user_message, info=info_for_gen
+                )
+                parts = []
+                async for chunk in chains.generate.llm.astream(prompt):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield {"event": "token", "text": chunk.content}
+                generated = "".join(parts)
+            else:
+                generated = await chains.generate.apredict(
+                    request=user_message, info=info_for_gen
+                )
 
-            return RAGResponse(
-                status=Status.SUCCESS,
-                message="OK",
-                chat_id=chat_id,
-                message_id=message_id,
-                document_id=document_id,
-                generated_answer=generated,
-            )
+            if use_cache:
+                self.answer_cache.store(
+                    document_id,
+                    config_hash,
+                    message_emb,
+                    generated,
+                    searcher.fingerprint,
+                )
+
+            yield {
+                "event": "result",
+                "response": RAGResponse(
+                    status=Status.SUCCESS,
+                    message="OK",
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    document_id=document_id,
+                    generated_answer=generated,
+                ),
+            }
 
         except Exception as e:
             logger.exception("Error processing RAG request: %s", e)
-            return RAGResponse(
-                status=Status.ERROR,
-                message=str(e),
-                chat_id=chat_id,
-                message_id=message_id,
-                document_id=document_id,
-            )
+            yield {
+                "event": "result",
+                "response": RAGResponse(
+                    status=Status.ERROR,
+                    message=str(e),
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    document_id=document_id,
+                ),
+            }
+
+    async def process_rag_request(self, *args, **kwargs) -> RAGResponse:
+        """
+        Выполняет RAG запрос целиком и возвращает итоговый RAGResponse
+        """
+        async for event in self.stream_rag_request(
+            *args, **kwargs, stream_tokens=False
+        ):
+            if event["event"] == "result":
+                return event["response"]
@@ -1,7 +1,19 @@
+import asyncio
+import json
 import logging
+from uuid import UUID
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from config.contracts import RAGRequest, RAGResponse
+from config.contracts import (
+    RAGRequest,
+    RAGResponse,
+    IndexRequest,
+    IndexResponse,
+    IndexType,
+    Status,
+    decode_embeddings,
+)
 from rag_pipeline import RAGPipeline
 
 logger = logging.getLogger(__name__)
@@ -20,6 +32,40 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
 
+@router.get("/stats")
+async def stats():
+    logger.info("Stats endpoint accessed")
+    return {
+        "searcher_cache": rag_pipeline.searcher_cache.stats(),
+        "embedding_worker": rag_pipeline.embedding_worker.stats(),
+        "answer_cache": rag_pipeline.answer_cache.stats(),
+        "stage_cache": rag_pipeline.stage_cache.stats(),
+    }
+
+
+def _pipeline_args(request: RAGRequest) -> tuple:
+    return (
+        request.chat_id,
+        request.user_message,
+        str(request.document_id),
+        request.message_id,
+        request.llm,
+        request.prompt_retrieve,
+        request.prompt_augmentation,
+        request.prompt_generation,
+        request.top_k,
+        request.temperature,
+        request.threshold,
+        decode_embeddings(request.embeddings),
+        request.text_chunks,
+        request.index_type,
+        request.nprobe,
+        request.ef_search,
+        bool(request.speculative),
+        bool(request.use_cache),
+    )
+
+
 @router.post("/rag/process", response_model=RAGResponse)
 async def process_rag_request(request: RAGRequest):
     """Обработать RAG запрос"""
@@ -28,21 +74,7 @@ async def process_rag_request(request: RAGRequest):
 
         logger.info(f"Processing user message: {request.user_message[:100]}...")
 
-        result = await rag_pipeline.process_rag_request(
-            request.chat_id,
-            request.user_message,
-            str(request.document_id),
-            request.message_id,
-            request.llm,
-            request.prompt_retrieve,
-            request.prompt_augmentation,
-            request.prompt_generation,
-            request.top_k,
-            request.temperature,
-            request.threshold,
-            request.embeddings,
-            request.text_chunks,
-        )
+        result = await rag_pipeline.process_rag_request(*_pipeline_args(request))
 
         if result.status == "error":
             logger.error(f"RAG processing failed : {result.message}")
@@ -63,3 +95,77 @@ async def process_rag_request(request: RAGRequest):
         raise HTTPException(
             status_code=500, detail=f"Error processing RAG request: {str(e)}"
         )
+
+
+@router.post("/rag/process/stream")
+async def process_rag_request_stream(request: RAGRequest):
+    """
+    Обработать RAG запрос с потоковой выдачей (NDJSON).
+
+    Каждая строка - JSON событие: filtered, retrieved, selected, token и
+    итоговое result, поле data которого повторяет контракт RAGResponse
+    """
+    logger.info(f"Processing streaming RAG request for chat_id: {request.chat_id}")
+    # Ошибки разбора запроса должны вернуться кодом ответа до начала потока
+    try:
+        args = _pipeline_args(request)
+    except ValueError as e:
+        logger.error(f"Invalid streaming RAG request: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        async for event in rag_pipeline.stream_rag_request(*args):
+            if event["event"] == "result":
+                result = event["response"]
+                if result.status == "error":
+                    logger.error(f"RAG processing failed : {result.message}")
+                event = {"event": "result", "data": result.model_dump(mode="json")}
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@router.post("/rag/index", response_model=IndexResponse)
+async def upsert_document_index(request: IndexRequest):
+    """Зарегистрировать или обновить индекс документа"""
+    logger.info(f"Upserting index for document_id: {request.document_id}")
+    try:
+        await asyncio.to_thread(
+            rag_pipeline.index_store.upsert,
+            str(request.document_id),
+            decode_embeddings(request.embeddings),
+            request.text_chunks,
+            IndexType(request.index_type or IndexType.AUTO).value,
+        )
+        rag_pipeline.answer_cache.invalidate(str(request.document_id))
+        return IndexResponse(
+            status=Status.SUCCESS,
+            message="Index stored",
+            document_id=str(request.document_id),
+            chunks_count=len(request.text_chunks),
+        )
+    except AssertionError as e:
+        logger.error(f"Invalid index data: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error storing index: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Error storing index: {str(e)}"
+        )
+
+
+@router.delete("/rag/index/{document_id}", response_model=IndexResponse)
+async def delete_document_index(document_id: UUID):
+    """Удалить индекс документа"""
+    logger.info(f"Deleting index for document_id: {document_id}")
+    removed = await asyncio.to_thread(
+        rag_pipeline.index_store.delete, str(document_id)
+    )
+    rag_pipeline.answer_cache.invalidate(str(document_id))
+    if not removed:
+        raise HTTPException(status_code=404, detail="Index not found")
+    return IndexResponse(
+        status=Status.SUCCESS,
+        message="Index deleted",
+        document_id=str(document_id),
+    )
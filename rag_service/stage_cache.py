@@ -0,0 +1,235 @@
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from langchain.chains import LLMChain
+
+logger = logging.getLogger(__name__)
+
+
+class StageCache(abc.ABC):
+    """
+    Кэш точных совпадений для выходов отдельных этапов LLM (фильтр, переформулирование,
+    map-reduce).
+
+    Ключ - хэш шаблона промпта, модель, температура и подставленные значения.
+    При температуре выше max_temperature ответ модели недетерминирован и кэш
+    не используется. Сохраняются только выходы, которые удалось разобрать
+    переданным парсером. Наследники реализуют хранилище через _get и _set.
+    """
+
+    # Блокирующее хранилище вызывается из пула потоков, а не из event loop
+    blocking = False
+
+    def __init__(self, max_temperature: float):
+        self.max_temperature = max_temperature
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    @abc.abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    def _set(self, key: str, value: str):
+        ...
+
+    @staticmethod
+    def make_key(chain: LLMChain, inputs: Dict[str, str]) -> str:
+        template_hash = hashlib.sha256(
+            chain.prompt.template.encode("utf-8")
+        ).hexdigest()
+        payload = json.dumps(
+            [template_hash, chain.llm.model_name, chain.llm.temperature, inputs],
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _call(self, func, *args):
+        if self.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    async def apredict(
+        self,
+        chain: LLMChain,
+        parse: Optional[Callable[[str], Any]] = None,
+        **inputs,
+    ) -> Any:
+        """
+        Возвращает сохраненный выход цепочки для тех же входов или вызывает LLM.
+        Если передан parse, возвращается parse(выход); выход, на котором parse
+        выбросил исключение, не сохраняется, а исключение пробрасывается
+        """
+        if parse is None:
+            parse = str
+        temperature = chain.llm.temperature or 0.0
+        if temperature > self.max_temperature:
+            self._count("skipped")
+            return parse(await chain.apredict(**inputs))
+
+        key = self.make_key(chain, inputs)
+        try:
+            cached = await self._call(self._get, key)
+        except Exception as e:
+            logger.error("Stage cache lookup failed: %s", e)
+            cached = None
+        if cached is not None:
+            self._count("hits")
+            return parse(cached)
+
+        self._count("misses")
+        output = await chain.apredict(**inputs)
+        result = parse(output)
+        try:
+            await self._call(self._set, key, output)
+        except Exception as e:
+            logger.error("Stage cache write failed: %s", e)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class NoStageCache(StageCache):
+    def __init__(self):
+        super().__init__(max_temperature=-1.0)
+
+    def _get(self, key: str) -> Optional[str]:
+        return None
+
+    def _set(self, key: str, value: str):
+        pass
+
+
+class MemoryStageCache(StageCache):
+    """
+    LRU-кэш в памяти процесса
+    """
+
+    def __init__(self, max_temperature: float, max_entries: int):
+        super().__init__(max_temperature)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SqliteStageCache(StageCache):
+    """
+    Кэш в локальном файле SQLite, общий для всех воркеров uvicorn на одной машине.
+    Размер ограничивается max_entries, вытесняются давно не читавшиеся записи.
+    """
+
+    blocking = True
+    PRUNE_EVERY = 100
+
+    def __init__(self, max_temperature: float, max_entries: int, path: str):
+        super().__init__(max_temperature)
+        self.max_entries = max_entries
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stage_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS stage_cache_last_access "
+                "ON stage_cache (last_access)"
+            )
+        logger.info("Initialized SQLite stage cache in %s", path)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        with conn:
+            row = conn.execute(
+                "SELECT value FROM stage_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE stage_cache SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return row[0]
+
+    def _set(self, key: str, value: str):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO stage_cache (key, value, last_access) "
+                "VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            # Счетчик общий для потоков: очистку запускает каждая PRUNE_EVERY-я запись
+            with self._writes_lock:
+                self._writes += 1
+                prune = self._writes % self.PRUNE_EVERY == 0
+            if prune:
+                conn.execute(
+                    "DELETE FROM stage_cache WHERE key IN ("
+                    "SELECT key FROM stage_cache ORDER BY last_access DESC "
+                    "LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+
+def create_stage_cache(
+    backend: str, max_temperature: float, max_entries: int, path: str
+) -> StageCache:
+    if backend == "memory":
+        return MemoryStageCache(max_temperature, max_entries)
+    if backend == "sqlite":
+        return SqliteStageCache(max_temperature, max_entries, path)
+    if backend == "none":
+        return NoStageCache()
+    raise ValueError(f"Unknown stage cache backend: {backend}")
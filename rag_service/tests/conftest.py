@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Модули сервиса импортируются плоско, как при запуске из rag_service
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
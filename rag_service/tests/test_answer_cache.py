@@ -0,0 +1,43 @@
+from answer_cache import AnswerCache
+
+
+def make_cache(**kwargs):
+    options = {"max_entries": 10, "ttl_seconds": 3600, "similarity_threshold": 0.9}
+    options.update(kwargs)
+    return AnswerCache(**options)
+
+
+def test_lookup_hits_similar_query():
+    cache = make_cache()
+    cache.store("doc", "config", [1.0, 0.0], "answer", "v1")
+    assert cache.lookup("doc", "config", [0.99, 0.141], "v1") == "answer"
+    assert cache.lookup("doc", "config", [0.0, 1.0], "v1") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lookup_misses_other_config_and_version():
+    cache = make_cache()
+    cache.store("doc", "config", [1.0, 0.0], "answer", "v1")
+    assert cache.lookup("doc", "other", [1.0, 0.0], "v1") is None
+    assert cache.lookup("doc", "config", [1.0, 0.0], "v2") is None
+    # Запись старой версии удаляется при первом промахе
+    assert cache.lookup("doc", "config", [1.0, 0.0], "v1") is None
+
+
+def test_invalidate_removes_document_answers():
+    cache = make_cache()
+    cache.store("doc", "config", [1.0, 0.0], "answer")
+    cache.store("other", "config", [1.0, 0.0], "answer")
+    assert cache.invalidate("doc") == 1
+    assert cache.lookup("doc", "config", [1.0, 0.0]) is None
+    assert cache.lookup("other", "config", [1.0, 0.0]) == "answer"
+
+
+def test_lru_eviction():
+    cache = make_cache(max_entries=2)
+    for i in range(3):
+        cache.store("doc", f"config-{i}", [1.0, 0.0], f"answer-{i}")
+    assert cache.lookup("doc", "config-0", [1.0, 0.0]) is None
+    assert cache.lookup("doc", "config-2", [1.0, 0.0]) == "answer-2"
+    assert cache.stats()["evictions"] == 1
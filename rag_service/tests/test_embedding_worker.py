@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from embedding_worker import EmbeddingWorker  # noqa: E402
+
+
+class FakeEmbedder:
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    def encode(self, texts, batch_size, normalize_embeddings):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return np.array([[float(len(text))] for text in texts])
+
+
+def encode_all(worker, texts):
+    async def run():
+        try:
+            return await asyncio.gather(
+                *(worker.encode(text) for text in texts), return_exceptions=True
+            )
+        finally:
+            await worker.shutdown()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_share_batches():
+    embedder = FakeEmbedder()
+    worker = EmbeddingWorker(embedder, max_batch_size=4, max_wait_ms=50)
+    texts = ["x" * size for size in range(1, 11)]
+    vectors = encode_all(worker, texts)
+    assert vectors == [[float(size)] for size in range(1, 11)]
+    assert [len(batch) for batch in embedder.batches] == [4, 4, 2]
+    stats = worker.stats()
+    assert stats["batches"] == 3
+    assert stats["items"] == 10
+    assert stats["max_batch_size"] == 4
+
+
+def test_batch_error_reaches_every_request():
+    embedder = FakeEmbedder(error=RuntimeError("model failed"))
+    worker = EmbeddingWorker(embedder, max_batch_size=8, max_wait_ms=50)
+    results = encode_all(worker, ["a", "b", "c"])
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(embedder.batches) == 1
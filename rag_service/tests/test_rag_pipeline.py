@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from answer_cache import AnswerCache  # noqa: E402
+from embedding_search import SearcherCache  # noqa: E402
+from index_store import IndexStore  # noqa: E402
+from rag_pipeline import RAGChains, RAGPipeline, app_config  # noqa: E402
+
+DOCUMENT_ID = "document"
+CHUNKS = ["alpha", "beta", "gamma"]
+
+
+def embed(text):
+    seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(312).astype("float32")
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingWorker:
+    async def encode(self, text):
+        return embed(text).tolist()
+
+
+class FakeStageCache:
+    def __init__(self):
+        self.calls = []
+        self.cancelled = []
+
+    async def apredict(self, chain, parse=None, **inputs):
+        self.calls.append(chain.name)
+        try:
+            await asyncio.sleep(chain.delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(chain.name)
+            raise
+        return parse(chain.output) if parse else chain.output
+
+
+class FakeLLM:
+    def __init__(self, output):
+        self.output = output
+
+    async def astream(self, prompt):
+        for part in self.output.split(" "):
+            yield SimpleNamespace(content=part + " ")
+
+
+class FakeChain:
+    def __init__(self, name, output, delay=0.0):
+        self.name = name
+        self.output = output
+        self.delay = delay
+        self.calls = 0
+        self.prompt = SimpleNamespace(format=lambda **inputs: "prompt")
+        self.llm = FakeLLM(output)
+
+    async def apredict(self, **inputs):
+        self.calls += 1
+        return self.output
+
+
+def make_chains(passed=True, rewrite_delay=0.0):
+    return RAGChains(
+        filter=FakeChain("filter", json.dumps({"result": "yes" if passed else "no"})),
+        retrieve=FakeChain("retrieve", "improved query", rewrite_delay),
+        map_reduce=FakeChain("map_reduce", json.dumps(["alpha"])),
+        generate=FakeChain("generate", "final answer"),
+    )
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = RAGPipeline.__new__(RAGPipeline)
+    pipeline.config = app_config
+    pipeline.embedding_worker = FakeEmbeddingWorker()
+    pipeline.stage_cache = FakeStageCache()
+    pipeline.searcher_cache = SearcherCache(app_config.SEARCHER_CACHE_MAX_BYTES)
+    pipeline.index_store = IndexStore(
+        str(tmp_path / "indexes"), pipeline.searcher_cache
+    )
+    pipeline.answer_cache = AnswerCache(100, 3600, 0.95)
+    pipeline.index_store.upsert(
+        DOCUMENT_ID, np.stack([embed(chunk) for chunk in CHUNKS]), CHUNKS, "flat"
+    )
+    pipeline.chains = make_chains()
+    pipeline._get_chains = lambda *args: pipeline.chains
+    return pipeline
+
+
+def collect(pipeline, message="question", **kwargs):
+    async def run():
+        return [
+            event
+            async for event in pipeline.stream_rag_request(
+                "chat",
+                message,
+                DOCUMENT_ID,
+                None,
+                "model",
+                "retrieve",
+                "augment",
+                "generate",
+                3,
+                0.1,
+                -1.0,
+                None,
+                None,
+                **kwargs,
+            )
+        ]
+
+    return asyncio.run(run())
+
+
+def names(events):
+    return [event["event"] for event in events]
+
+
+def test_stream_events_in_stage_order(pipeline):
+    events = collect(pipeline)
+    assert names(events) == [
+        "filtered",
+        "retrieved",
+        "selected",
+        "token",
+        "token",
+        "result",
+    ]
+    assert events[1]["chunks"] == len(CHUNKS)
+    assert events[2]["segments"] == 1
+    text = "".join(event["text"] for event in events if event["event"] == "token")
+    assert text.strip() == "final answer"
+    assert events[-1]["response"].generated_answer == text
+
+
+def test_filter_reject_cancels_speculative_tasks(pipeline):
+    pipeline.chains = make_chains(passed=False, rewrite_delay=10)
+    started = time.monotonic()
+    events = collect(pipeline, speculative=True)
+    assert time.monotonic() - started < 5
+    assert names(events) == ["filtered", "result"]
+    assert events[0]["passed"] is False
+    assert events[-1]["response"].message == "IS_BAD_ANSWER"
+    assert pipeline.stage_cache.cancelled == ["retrieve"]
+
+
+def test_answer_cache_hit_skips_llm(pipeline):
+    first = collect(pipeline, use_cache=True, stream_tokens=False)
+    llm_calls = len(pipeline.stage_cache.calls)
+    second = collect(pipeline, use_cache=True, stream_tokens=False)
+    assert names(second) == ["cached", "result"]
+    assert second[-1]["response"].generated_answer == "final answer"
+    assert first[-1]["response"].generated_answer == "final answer"
+    assert len(pipeline.stage_cache.calls) == llm_calls
+    assert pipeline.chains.generate.calls == 1
+
+
+def test_answer_cache_miss_for_other_question(pipeline):
+    collect(pipeline, use_cache=True, stream_tokens=False)
+    events = collect(pipeline, "other question", use_cache=True, stream_tokens=False)
+    assert "cached" not in names(events)
+    assert pipeline.chains.generate.calls == 2
+
+
+def test_answer_cache_off_by_default(pipeline):
+    collect(pipeline, stream_tokens=False)
+    events = collect(pipeline, stream_tokens=False)
+    assert "cached" not in names(events)
+
+
+def test_index_upsert_invalidates_cached_answers(pipeline):
+    collect(pipeline, use_cache=True, stream_tokens=False)
+    pipeline.index_store.upsert(
+        DOCUMENT_ID, np.stack([embed(chunk) for chunk in CHUNKS]), CHUNKS, "flat"
+    )
+    events = collect(pipeline, use_cache=True, stream_tokens=False)
+    assert "cached" not in names(events)
+    assert pipeline.chains.generate.calls == 2